@@ -1,166 +1,345 @@
 import boto3
 import json
-from datetime import datetime, timedelta
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from itertools import islice
 import os
 import logging
-from decimal import Decimal
+import time
+from boto3.dynamodb.types import TypeSerializer
+
+# NumPy is optional in the Lambda runtime (e.g. via a layer); fall back to builtins
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # Setup logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize AWS clients
-ec2 = boto3.resource('ec2')
-cloudwatch = boto3.client('cloudwatch')
-dynamodb = boto3.resource('dynamodb')
+# Initialize AWS clients (one shared session; pool sized above the worker count)
+_session = boto3.session.Session()
+_CONFIG = Config(max_pool_connections=50, retries={'mode': 'adaptive', 'total_max_attempts': 5})
+ec2_client = _session.client('ec2', config=_CONFIG)
+cloudwatch = _session.client('cloudwatch', config=_CONFIG)
+dynamodb_client = _session.client('dynamodb', config=_CONFIG)
+_serializer = TypeSerializer()
 
 # DynamoDB table name (set in Lambda environment variable)
 DYNAMO_TABLE_NAME = os.environ.get('DYNAMO_TABLE_NAME', 'EC2IdleInstanceMetrics')
 
+# Settings
+CPU_THRESHOLD = 10.0             # %
+NETWORK_THRESHOLD = 1048576      # 1 MB in bytes
+EVALUATION_MINUTES = 5           # Evaluation window (5 mins demo)
+
+# DescribeInstances page size (the API maximum)
+DESCRIBE_PAGE_SIZE = 1000
+# GetMetricData accepts at most 500 queries per request
+MAX_QUERIES_PER_REQUEST = 500
+# One query per (metric, statistic) -- never a Statistics list, since CloudWatch
+# bills for every datapoint returned across the requested statistics
+METRIC_QUERIES = (
+    ('cpu_avg', 'CPUUtilization', 'Average'),
+    ('cpu_max', 'CPUUtilization', 'Maximum'),
+    ('nin_sum', 'NetworkIn', 'Sum'),
+    ('nout_sum', 'NetworkOut', 'Sum'),
+)
+# BatchWriteItem accepts at most 25 put requests per call
+MAX_BATCH_WRITE_ITEMS = 25
+# Exponential backoff (seconds) between resends of UnprocessedItems
+BATCH_WRITE_BACKOFF = 0.05
+BATCH_WRITE_MAX_BACKOFF = 2.0
+# BatchWriteItem calls per batch before the remaining UnprocessedItems are given up on
+BATCH_WRITE_MAX_ATTEMPTS = 5
+# Concurrent CloudWatch/EC2 calls; kept low to avoid API throttling
+MAX_WORKERS = 5
+
+def _metric_query(query_id, instance_id, metric_name, stat):
+    return {
+        'Id': query_id,
+        'MetricStat': {
+            'Metric': {
+                'Namespace': 'AWS/EC2',
+                'MetricName': metric_name,
+                'Dimensions': [{'Name': 'InstanceId', 'Value': instance_id}]
+            },
+            'Period': 60,
+            'Stat': stat
+        },
+        'ReturnData': True
+    }
+
+def _get_metric_data(queries, start_time, end_time):
+    values = {}
+    kwargs = {'MetricDataQueries': queries, 'StartTime': start_time, 'EndTime': end_time}
+    while True:
+        response = cloudwatch.get_metric_data(**kwargs)
+        for result in response.get('MetricDataResults', []):
+            values.setdefault(result['Id'], []).extend(result.get('Values', []))
+        if 'NextToken' not in response:
+            return values
+        kwargs['NextToken'] = response['NextToken']
+
+def submit_metric_queries(pool, queries, start_time, end_time):
+    """
+    Submit MetricDataQueries to the pool in batches of 500 and return {future: batch}.
+    """
+    futures = {}
+    it = iter(queries)
+    while True:
+        chunk = list(islice(it, MAX_QUERIES_PER_REQUEST))
+        if not chunk:
+            break
+        futures[pool.submit(_get_metric_data, chunk, start_time, end_time)] = chunk
+    return futures
+
+def _paginate_running(*extra_filters):
+    paginator = ec2_client.get_paginator('describe_instances')
+    return paginator.paginate(
+        Filters=[{'Name': 'instance-state-name', 'Values': ['running']}, *extra_filters],
+        PaginationConfig={'PageSize': DESCRIBE_PAGE_SIZE}
+    )
+
+def _zone_pages(zone):
+    return list(_paginate_running({'Name': 'availability-zone', 'Values': [zone]}))
+
+def iter_running_pages():
+    """
+    Yield describe_instances pages of running instances, paginating each AZ in parallel.
+    """
+    zones = [az['ZoneName'] for az in ec2_client.describe_availability_zones()['AvailabilityZones']]
+    if len(zones) <= 1:
+        yield from _paginate_running()
+        return
+
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(zones))) as az_pool:
+        futures = [az_pool.submit(_zone_pages, zone) for zone in zones]
+        for future in as_completed(futures):
+            yield from future.result()
+
+def _to_attribute_values(instance_info, timestamp):
+    # Pre-serialized low-level item: numbers go straight to 'N' strings, no Decimal round-trip
+    return {
+        'InstanceId': {'S': instance_info['InstanceId']},
+        'EvaluationTimestamp': {'S': timestamp},
+        'InstanceType': {'S': instance_info['InstanceType']},
+        'AvgCPU': {'N': str(instance_info['AvgCPU'])},
+        'MaxCPU': {'N': str(instance_info['MaxCPU'])},
+        'NetworkInBytes': {'N': str(instance_info['NetworkInBytes'])},
+        'NetworkOutBytes': {'N': str(instance_info['NetworkOutBytes'])},
+        'TotalNetworkBytes': {'N': str(instance_info['TotalNetworkBytes'])},
+        'Status': {'S': instance_info['Status']},
+        'Recommendation': {'S': instance_info['Recommendation']},
+        'Region': {'S': instance_info['Region']},
+        'Tags': _serializer.serialize(instance_info['Tags']),
+        'LaunchTime': {'S': instance_info['LaunchTime']}
+    }
+
+def write_batch(put_requests):
+    """
+    Write up to 25 put requests with BatchWriteItem, resending any UnprocessedItems
+    with exponential backoff so throttled batches are not degraded to single writes.
+    Gives up after BATCH_WRITE_MAX_ATTEMPTS calls and returns the put requests that
+    were still unprocessed ([] when everything was written).
+    """
+    request_items = {DYNAMO_TABLE_NAME: put_requests}
+    backoff = BATCH_WRITE_BACKOFF
+    for attempt in range(BATCH_WRITE_MAX_ATTEMPTS):
+        if attempt:
+            time.sleep(backoff)
+            backoff = min(backoff * 2, BATCH_WRITE_MAX_BACKOFF)
+        response = dynamodb_client.batch_write_item(RequestItems=request_items)
+        request_items = response.get('UnprocessedItems')
+        if not request_items:
+            return []
+
+    leftover = request_items.get(DYNAMO_TABLE_NAME, [])
+    logger.error(f"{len(leftover)} items still unprocessed after {BATCH_WRITE_MAX_ATTEMPTS} BatchWriteItem attempts")
+    return leftover
+
+def flush_batch(put_requests):
+    """
+    Write one batch of put requests and return the InstanceIds that did not reach DynamoDB.
+    """
+    instance_ids = [r['PutRequest']['Item']['InstanceId']['S'] for r in put_requests]
+    try:
+        leftover = write_batch(put_requests)
+    except Exception as e:
+        logger.error(f"Error writing batch of {len(instance_ids)} records to DynamoDB ({', '.join(instance_ids)}): {str(e)}")
+        return instance_ids
+    return [r['PutRequest']['Item']['InstanceId']['S'] for r in leftover]
+
+def analyze_instance(instance_info, idx, metric_values, timestamp):
+    """
+    Classify one instance from its batched metric values and tag it if idle.
+    """
+    cpu_avg_values = metric_values.get(f'cpu_avg_{idx}', [])
+    cpu_max_values = metric_values.get(f'cpu_max_{idx}', [])
+    netin_values = metric_values.get(f'nin_sum_{idx}', [])
+    netout_values = metric_values.get(f'nout_sum_{idx}', [])
+
+    if not cpu_avg_values:
+        instance_info.update({
+            'Status': 'NoData',
+            'Recommendation': 'Enable detailed monitoring'
+        })
+        return instance_info
+
+    # Calculate averages and totals
+    if np is not None:
+        avg_cpu = float(np.asarray(cpu_avg_values, dtype=np.float64).mean())
+        max_cpu = float(np.asarray(cpu_max_values or cpu_avg_values, dtype=np.float64).max())
+        total_net_in = float(np.asarray(netin_values, dtype=np.float64).sum())
+        total_net_out = float(np.asarray(netout_values, dtype=np.float64).sum())
+    else:
+        avg_cpu = sum(cpu_avg_values) / len(cpu_avg_values)
+        max_cpu = max(cpu_max_values or cpu_avg_values)
+        total_net_in = sum(netin_values)
+        total_net_out = sum(netout_values)
+    total_network = total_net_in + total_net_out
+
+    instance_info.update({
+        'AvgCPU': round(avg_cpu, 2),
+        'MaxCPU': round(max_cpu, 2),
+        'NetworkInBytes': int(total_net_in),
+        'NetworkOutBytes': int(total_net_out),
+        'TotalNetworkBytes': int(total_network),
+        'EvaluationTimestamp': timestamp
+    })
+
+    # Determine idle/active
+    if avg_cpu < CPU_THRESHOLD and total_network < NETWORK_THRESHOLD:
+        instance_info['Status'] = 'Idle'
+        instance_info['Recommendation'] = 'Consider stopping instance'
+
+        # Optional tagging
+        try:
+            ec2_client.create_tags(
+                Resources=[instance_info['InstanceId']],
+                Tags=[
+                    {'Key': 'CostOptimization', 'Value': 'CandidateForStop'},
+                    {'Key': 'IdleDetectedAt', 'Value': timestamp}
+                ]
+            )
+        except Exception as tag_err:
+            logger.warning(f"Tagging failed for {instance_info['InstanceId']}: {tag_err}")
+    else:
+        instance_info['Status'] = 'Active'
+        instance_info['Recommendation'] = 'Keep running'
+
+    return instance_info
+
 def lambda_handler(event, context):
     """
     Lambda function to detect idle EC2 instances and store real-time analysis in DynamoDB.
     """
-    # Settings
-    CPU_THRESHOLD = 10.0             # %
-    NETWORK_THRESHOLD = 1048576      # 1 MB in bytes
-    EVALUATION_MINUTES = 5           # Evaluation window (5 mins demo)
-    timestamp = datetime.utcnow().isoformat()
+    # One clock reading for the row timestamp, the metric window and launch ages.
+    # Stored without a UTC offset to match existing records and the dashboards' parsing
+    now = datetime.now(timezone.utc)
+    timestamp = now.replace(tzinfo=None).isoformat()
 
     logger.info(f"Starting EC2 idle scan at {timestamp}")
     
-    # Get DynamoDB table reference
-    table = dynamodb.Table(DYNAMO_TABLE_NAME)
-    
-    # Get all running EC2 instances
-    instances = ec2.instances.filter(
-        Filters=[{'Name': 'instance-state-name', 'Values': ['running']}]
-    )
+    end_time = now
+    start_time = end_time - timedelta(minutes=EVALUATION_MINUTES)
 
     idle_instances = []
     analyzed_instances = []
+    unwritten_instances = []
 
-    for instance in instances:
-        instance_info = {
-            'InstanceId': instance.id,
-            'InstanceType': instance.instance_type,
-            'LaunchTime': instance.launch_time.isoformat(),
-            'Region': instance.placement['AvailabilityZone'][:-1],
-            'Tags': {tag['Key']: tag['Value'] for tag in (instance.tags or [])}
-        }
+    candidates = []
+    metric_futures = {}
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        # Page through running instances with the low-level client (no lazy Resource loads)
+        for page in iter_running_pages():
+            queries = []
+            for reservation in page['Reservations']:
+                for instance in reservation['Instances']:
+                    # Tags come inline with the page; skip AutoStop=false before building anything else
+                    tags = {tag['Key']: tag['Value'] for tag in instance.get('Tags', [])}
+                    if tags.get('AutoStop') == 'false':
+                        logger.info(f"Skipping instance {instance['InstanceId']} (AutoStop=false)")
+                        continue
 
-        # Skip if tag AutoStop=false
-        if instance_info['Tags'].get('AutoStop') == 'false':
-            logger.info(f"Skipping instance {instance.id} (AutoStop=false)")
-            continue
+                    instance_info = {
+                        'InstanceId': instance['InstanceId'],
+                        'InstanceType': instance['InstanceType'],
+                        'LaunchTime': instance['LaunchTime'].isoformat(),
+                        'Region': instance['Placement']['AvailabilityZone'][:-1],
+                        'Tags': tags
+                    }
 
-        end_time = datetime.utcnow()
-        start_time = end_time - timedelta(minutes=EVALUATION_MINUTES)
-        logger.info(f"Analyzing {instance.id} from {start_time} to {end_time}")
+                    # Instances younger than the window have no usable metrics yet; skip CloudWatch
+                    launch_age = now - instance['LaunchTime']
+                    if launch_age < timedelta(minutes=EVALUATION_MINUTES):
+                        instance_info.update({
+                            'Status': 'NewInstance',
+                            'Recommendation': 'Re-evaluate after the first evaluation window'
+                        })
+                        analyzed_instances.append(instance_info)
+                        continue
 
-        try:
-            # CPU utilization
-            cpu_response = cloudwatch.get_metric_statistics(
-                Namespace='AWS/EC2',
-                MetricName='CPUUtilization',
-                Dimensions=[{'Name': 'InstanceId', 'Value': instance.id}],
-                StartTime=start_time,
-                EndTime=end_time,
-                Period=60,
-                Statistics=['Average', 'Maximum']
-            )
+                    # One GetMetricData query per metric/statistic, ids indexed back to the instance
+                    idx = len(candidates)
+                    candidates.append(instance_info)
+                    queries.extend(
+                        _metric_query(f'{prefix}_{idx}', instance['InstanceId'], metric_name, stat)
+                        for prefix, metric_name, stat in METRIC_QUERIES
+                    )
 
-            # Network In
-            netin_response = cloudwatch.get_metric_statistics(
-                Namespace='AWS/EC2',
-                MetricName='NetworkIn',
-                Dimensions=[{'Name': 'InstanceId', 'Value': instance.id}],
-                StartTime=start_time,
-                EndTime=end_time,
-                Period=60,
-                Statistics=['Sum']
-            )
+            # This page's metric batches run while the next page is fetched
+            metric_futures.update(submit_metric_queries(pool, queries, start_time, end_time))
 
-            # Network Out
-            netout_response = cloudwatch.get_metric_statistics(
-                Namespace='AWS/EC2',
-                MetricName='NetworkOut',
-                Dimensions=[{'Name': 'InstanceId', 'Value': instance.id}],
-                StartTime=start_time,
-                EndTime=end_time,
-                Period=60,
-                Statistics=['Sum']
-            )
+        logger.info(f"Analyzing {len(candidates)} instances from {start_time} to {end_time}")
 
-            cpu_datapoints = cpu_response.get('Datapoints', [])
-            netin_datapoints = netin_response.get('Datapoints', [])
-            netout_datapoints = netout_response.get('Datapoints', [])
+        # A failed batch only costs its own instances: they are left unclassified and
+        # listed in metric_errors, while every batch that came back is still analyzed
+        metric_values = {}
+        failed_idx = set()
+        for future in as_completed(metric_futures):
+            try:
+                metric_values.update(future.result())
+            except Exception as e:
+                batch = metric_futures[future]
+                logger.error(f"Error fetching CloudWatch metrics for a batch of {len(batch)} queries "
+                             f"({batch[0]['Id']} .. {batch[-1]['Id']}): {str(e)}")
+                # Query ids are '<prefix>_<candidate index>'
+                failed_idx.update(int(q['Id'].rsplit('_', 1)[1]) for q in batch)
 
-            if not cpu_datapoints:
-                instance_info.update({
-                    'Status': 'NoData',
-                    'Recommendation': 'Enable detailed monitoring'
-                })
+        metric_errors = [candidates[idx]['InstanceId'] for idx in sorted(failed_idx)]
+        futures = {
+            pool.submit(analyze_instance, instance_info, idx, metric_values, timestamp): instance_info['InstanceId']
+            for idx, instance_info in enumerate(candidates)
+            if idx not in failed_idx
+        }
+
+        put_requests = []
+        for future in as_completed(futures):
+            instance_id = futures[future]
+            try:
+                instance_info = future.result()
                 analyzed_instances.append(instance_info)
+                if instance_info['Status'] == 'NoData':
+                    continue
+                if instance_info['Status'] == 'Idle':
+                    idle_instances.append(instance_info)
+                put_request = {'PutRequest': {'Item': _to_attribute_values(instance_info, timestamp)}}
+            except Exception as e:
+                logger.error(f"Error analyzing {instance_id}: {str(e)}")
                 continue
 
-            # Calculate averages and totals
-            avg_cpu = sum(dp['Average'] for dp in cpu_datapoints) / len(cpu_datapoints)
-            max_cpu = max(dp['Maximum'] for dp in cpu_datapoints)
-            total_net_in = sum(dp['Sum'] for dp in netin_datapoints)
-            total_net_out = sum(dp['Sum'] for dp in netout_datapoints)
-            total_network = total_net_in + total_net_out
-
-            instance_info.update({
-                'AvgCPU': round(avg_cpu, 2),
-                'MaxCPU': round(max_cpu, 2),
-                'NetworkInBytes': int(total_net_in),
-                'NetworkOutBytes': int(total_net_out),
-                'TotalNetworkBytes': int(total_network),
-                'EvaluationTimestamp': timestamp
-            })
-
-            # Determine idle/active
-            if avg_cpu < CPU_THRESHOLD and total_network < NETWORK_THRESHOLD:
-                instance_info['Status'] = 'Idle'
-                instance_info['Recommendation'] = 'Consider stopping instance'
-                idle_instances.append(instance_info)
-
-                # Optional tagging
-                try:
-                    instance.create_tags(Tags=[
-                        {'Key': 'CostOptimization', 'Value': 'CandidateForStop'},
-                        {'Key': 'IdleDetectedAt', 'Value': timestamp}
-                    ])
-                except Exception as tag_err:
-                    logger.warning(f"Tagging failed for {instance.id}: {tag_err}")
-            else:
-                instance_info['Status'] = 'Active'
-                instance_info['Recommendation'] = 'Keep running'
-
-            analyzed_instances.append(instance_info)
-
-            # 🔹 Store record in DynamoDB (each instance's current status)
-            table.put_item(
-                Item={
-                    'InstanceId': instance.id,
-                    'EvaluationTimestamp': timestamp,
-                    'InstanceType': instance.instance_type,
-                    'AvgCPU': Decimal(str(round(avg_cpu, 2))),
-                    'MaxCPU': Decimal(str(round(max_cpu, 2))),
-                    'NetworkInBytes': Decimal(str(total_net_in)),
-                    'NetworkOutBytes': Decimal(str(total_net_out)),
-                    'TotalNetworkBytes': Decimal(str(total_network)),
-                    'Status': instance_info['Status'],
-                    'Recommendation': instance_info['Recommendation'],
-                    'Region': instance_info['Region'],
-                    'Tags': json.dumps(instance_info['Tags']),
-                    'LaunchTime': instance.launch_time.isoformat()
-                }
-            )
+            # 🔹 Store record in DynamoDB (each instance's current status); a failed
+            # write is reported per batch, separately from the analysis errors above
+            put_requests.append(put_request)
+            if len(put_requests) == MAX_BATCH_WRITE_ITEMS:
+                batch, put_requests = put_requests, []
+                unwritten_instances.extend(flush_batch(batch))
 
-        except Exception as e:
-            logger.error(f"Error analyzing {instance.id}: {str(e)}")
+        if put_requests:
+            unwritten_instances.extend(flush_batch(put_requests))
 
     summary = {
         'timestamp': timestamp,
@@ -171,7 +350,11 @@ def lambda_handler(event, context):
             'active_instances': len([i for i in analyzed_instances if i.get('Status') == 'Active'])
         },
         'idle_instances': idle_instances,
-        'all_instances': analyzed_instances
+        'all_instances': analyzed_instances,
+        # Analyzed but not stored in DynamoDB (throttled past the retry limit)
+        'unwritten_instances': unwritten_instances,
+        # Not classified: their CloudWatch metrics request failed
+        'metric_errors': metric_errors
     }
 
     logger.info(f"Scan complete. Idle: {len(idle_instances)} / Total: {len(analyzed_instances)}")
@@ -2,131 +2,257 @@
 import boto3
 import json
 import os
-from datetime import datetime
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from itertools import islice
 
-ec2 = boto3.client("ec2")
-dynamodb = boto3.resource("dynamodb")
+# Clients live at module scope so warm invocations reuse them; one session means
+# credentials and endpoints are resolved once per container. The pool is sized
+# above the delete workers and adaptive retries absorb throttling.
+_session = boto3.session.Session()
+_CONFIG = Config(max_pool_connections=32, retries={"mode":"adaptive","total_max_attempts":5})
+ec2 = _session.client("ec2", config=_CONFIG)
+dynamodb = _session.resource("dynamodb", config=_CONFIG)
 LOG_TABLE = os.environ.get("CLEANUP_LOG_TABLE", "EC2CleanupLogs")
+# start/stop/terminate accept up to 1000 instance ids per call
+MAX_INSTANCE_IDS_PER_CALL = 1000
+# volume/EIP/SG deletes have no bulk API, run them on a bounded pool
+MAX_DELETE_WORKERS = 8
+# EC2 rejects filters with more than 200 values
+MAX_FILTER_VALUES = 200
+# module scope so warm invocations reuse the same Table object
+_log_table = dynamodb.Table(LOG_TABLE)
 
 def log_action(item):
     try:
-        table = dynamodb.Table(LOG_TABLE)
-        table.put_item(Item=item)
+        _log_table.put_item(Item=item)
     except Exception:
         pass
 
+def _describe_by_id(describe, ids):
+    """
+    Look up all ids with one describe call; describe(ids) returns {id: resource}.
+    A single unknown id fails the whole bulk request, so on error fall back to
+    per-id calls to keep the error attached to the offending id.
+    """
+    if not ids:
+        return {}, {}
+    try:
+        return describe(ids), {}
+    except Exception:
+        found, errors = {}, {}
+        for i in ids:
+            try:
+                found.update(describe([i]))
+            except Exception as e:
+                errors[i] = f"error:{str(e)}"
+        return found, errors
+
+def _instances_by_id(instance_ids):
+    resp = ec2.describe_instances(InstanceIds=instance_ids)
+    return {inst["InstanceId"]: inst for r in resp["Reservations"] for inst in r["Instances"]}
+
+def _volumes_by_id(volume_ids):
+    return {v["VolumeId"]: v for v in ec2.describe_volumes(VolumeIds=volume_ids)["Volumes"]}
+
+def _addresses_by_id(allocation_ids):
+    return {a["AllocationId"]: a for a in ec2.describe_addresses(AllocationIds=allocation_ids)["Addresses"]}
+
+def _security_groups_by_id(group_ids):
+    return {g["GroupId"]: g for g in ec2.describe_security_groups(GroupIds=group_ids)["SecurityGroups"]}
+
+def _groups_in_use(group_ids):
+    # one ENI listing per 200 groups instead of one call per group
+    in_use = set()
+    paginator = ec2.get_paginator("describe_network_interfaces")
+    for chunk in _chunked(group_ids, MAX_FILTER_VALUES):
+        for page in paginator.paginate(Filters=[{"Name":"group-id","Values":chunk}]):
+            for eni in page["NetworkInterfaces"]:
+                in_use.update(g["GroupId"] for g in eni.get("Groups", []))
+    return in_use
+
+def _chunked(ids, size):
+    it = iter(ids)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _bulk_instance_action(call, response_key, instance_ids, ok):
+    """
+    Run an EC2 start/stop/terminate call for up to 1000 ids at a time and
+    return {id: result}. A rejected bulk call is retried per id so only the
+    offending instance reports the error.
+    """
+    results = {}
+    for chunk in _chunked(instance_ids, MAX_INSTANCE_IDS_PER_CALL):
+        try:
+            changed = call(InstanceIds=chunk)[response_key]
+            results.update({inst["InstanceId"]: ok for inst in changed})
+        except Exception:
+            for i in chunk:
+                try:
+                    call(InstanceIds=[i])
+                    results[i] = ok
+                except Exception as e:
+                    results[i] = f"error:{str(e)}"
+    return results
+
 def stop_instances(instance_ids, dry_run=True):
     resp = {"action":"stop_instances","requested":instance_ids,"results":[]}
-    for i in instance_ids:
-        try:
-            # validate current state
-            inst = ec2.describe_instances(InstanceIds=[i])["Reservations"][0]["Instances"][0]
-            state = inst["State"]["Name"]
-            if state == "stopped":
-                resp["results"].append({i: "already stopped"})
-                continue
-            if dry_run:
-                resp["results"].append({i: "dry_run_ok"})
-            else:
-                ec2.stop_instances(InstanceIds=[i])
-                resp["results"].append({i: "stop_requested"})
-        except Exception as e:
-            resp["results"].append({i: f"error:{str(e)}"})
+    # validate current state
+    instances, outcome = _describe_by_id(_instances_by_id, instance_ids)
+    to_stop = []
+    for i in dict.fromkeys(instance_ids):
+        if i in outcome:
+            continue
+        inst = instances.get(i)
+        if inst is None:
+            outcome[i] = "not_found"
+        elif inst["State"]["Name"] == "stopped":
+            outcome[i] = "already stopped"
+        elif dry_run:
+            outcome[i] = "dry_run_ok"
+        else:
+            to_stop.append(i)
+    if to_stop:
+        outcome.update(_bulk_instance_action(ec2.stop_instances, "StoppingInstances", to_stop, "stop_requested"))
+    resp["results"] = [{i: outcome.get(i, "stop_requested")} for i in instance_ids]
     return resp
 
 def start_instances(instance_ids, dry_run=True):
     resp = {"action":"start_instances","requested":instance_ids,"results":[]}
-    for i in instance_ids:
-        try:
-            inst = ec2.describe_instances(InstanceIds=[i])["Reservations"][0]["Instances"][0]
-            state = inst["State"]["Name"]
-            if state == "running":
-                resp["results"].append({i: "already running"})
-                continue
-            if dry_run:
-                resp["results"].append({i: "dry_run_ok"})
-            else:
-                ec2.start_instances(InstanceIds=[i])
-                resp["results"].append({i: "start_requested"})
-        except Exception as e:
-            resp["results"].append({i: f"error:{str(e)}"})
+    instances, outcome = _describe_by_id(_instances_by_id, instance_ids)
+    to_start = []
+    for i in dict.fromkeys(instance_ids):
+        if i in outcome:
+            continue
+        inst = instances.get(i)
+        if inst is None:
+            outcome[i] = "not_found"
+        elif inst["State"]["Name"] == "running":
+            outcome[i] = "already running"
+        elif dry_run:
+            outcome[i] = "dry_run_ok"
+        else:
+            to_start.append(i)
+    if to_start:
+        outcome.update(_bulk_instance_action(ec2.start_instances, "StartingInstances", to_start, "start_requested"))
+    resp["results"] = [{i: outcome.get(i, "start_requested")} for i in instance_ids]
     return resp
 
 def terminate_instances(instance_ids, dry_run=True):
     resp = {"action":"terminate_instances","requested":instance_ids,"results":[]}
-    for i in instance_ids:
-        try:
-            if dry_run:
-                resp["results"].append({i:"dry_run_ok"})
-            else:
-                ec2.terminate_instances(InstanceIds=[i])
-                resp["results"].append({i:"terminate_requested"})
-        except Exception as e:
-            resp["results"].append({i: f"error:{str(e)}"})
+    if dry_run:
+        outcome = {}
+    else:
+        outcome = _bulk_instance_action(ec2.terminate_instances, "TerminatingInstances",
+                                        list(dict.fromkeys(instance_ids)), "terminate_requested")
+    resp["results"] = [{i: outcome.get(i, "dry_run_ok" if dry_run else "terminate_requested")} for i in instance_ids]
     return resp
 
+def _run_parallel(fn, ids):
+    """
+    Run fn(id) for each id on a bounded worker pool and return {id: result}.
+    """
+    results = {}
+    if not ids:
+        return results
+    with ThreadPoolExecutor(max_workers=MAX_DELETE_WORKERS) as pool:
+        futures = {pool.submit(fn, i): i for i in ids}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                results[i] = f"error:{str(e)}"
+    return results
+
 def delete_volumes(volume_ids, dry_run=True):
     resp = {"action":"delete_volumes","requested":volume_ids,"results":[]}
-    for v in volume_ids:
-        try:
-            vol = ec2.describe_volumes(VolumeIds=[v])["Volumes"][0]
-            if vol["State"] != "available":
-                resp["results"].append({v: f"not_available_state:{vol['State']}"})
-                continue
-            if dry_run:
-                resp["results"].append({v:"dry_run_ok"})
-            else:
-                ec2.delete_volume(VolumeId=v)
-                resp["results"].append({v:"deleted"})
-        except Exception as e:
-            resp["results"].append({v: f"error:{str(e)}"})
+    vols, outcome = _describe_by_id(_volumes_by_id, volume_ids)
+    to_delete = []
+    for v in dict.fromkeys(volume_ids):
+        if v in outcome:
+            continue
+        vol = vols.get(v)
+        if vol is None:
+            outcome[v] = "not_found"
+        elif vol["State"] != "available":
+            outcome[v] = f"not_available_state:{vol['State']}"
+        elif dry_run:
+            outcome[v] = "dry_run_ok"
+        else:
+            to_delete.append(v)
+
+    def _delete_one(v):
+        ec2.delete_volume(VolumeId=v)
+        return "deleted"
+
+    outcome.update(_run_parallel(_delete_one, to_delete))
+    resp["results"] = [{v: outcome[v]} for v in volume_ids]
     return resp
 
 def release_eips(allocation_ids, dry_run=True):
     resp = {"action":"release_eips","requested":allocation_ids,"results":[]}
-    for a in allocation_ids:
-        try:
-            # ensure unassociated
-            addrs = ec2.describe_addresses(AllocationIds=[a])["Addresses"]
-            if not addrs:
-                resp["results"].append({a:"not_found"})
-                continue
-            if "AssociationId" in addrs[0]:
-                resp["results"].append({a:"associated"})
-                continue
-            if dry_run:
-                resp["results"].append({a:"dry_run_ok"})
-            else:
-                ec2.release_address(AllocationId=a)
-                resp["results"].append({a:"released"})
-        except Exception as e:
-            resp["results"].append({a: f"error:{str(e)}"})
+    addrs, outcome = _describe_by_id(_addresses_by_id, allocation_ids)
+    to_release = []
+    for a in dict.fromkeys(allocation_ids):
+        if a in outcome:
+            continue
+        # ensure unassociated
+        addr = addrs.get(a)
+        if addr is None:
+            outcome[a] = "not_found"
+        elif "AssociationId" in addr:
+            outcome[a] = "associated"
+        elif dry_run:
+            outcome[a] = "dry_run_ok"
+        else:
+            to_release.append(a)
+
+    def _release_one(a):
+        ec2.release_address(AllocationId=a)
+        return "released"
+
+    outcome.update(_run_parallel(_release_one, to_release))
+    resp["results"] = [{a: outcome[a]} for a in allocation_ids]
     return resp
 
 def delete_security_groups(group_ids, dry_run=True):
     resp = {"action":"delete_security_groups","requested":group_ids,"results":[]}
-    for g in group_ids:
-        try:
-            # skip default
-            gids = ec2.describe_security_groups(GroupIds=[g])["SecurityGroups"]
-            if not gids:
-                resp["results"].append({g:"not_found"})
-                continue
-            if gids[0]["GroupName"] == "default":
-                resp["results"].append({g:"default_group_skip"})
-                continue
-            # ensure not used by network interfaces
-            enis = ec2.describe_network_interfaces(Filters=[{"Name":"group-id","Values":[g]}])["NetworkInterfaces"]
-            if enis:
-                resp["results"].append({g:"in_use"})
-                continue
-            if dry_run:
-                resp["results"].append({g:"dry_run_ok"})
-            else:
-                ec2.delete_security_group(GroupId=g)
-                resp["results"].append({g:"deleted"})
-        except Exception as e:
-            resp["results"].append({g: f"error:{str(e)}"})
+    groups, outcome = _describe_by_id(_security_groups_by_id, group_ids)
+    # ensure not used by network interfaces
+    candidates = [g for g in dict.fromkeys(group_ids) if g in groups and groups[g]["GroupName"] != "default"]
+    try:
+        in_use = _groups_in_use(candidates) if candidates else set()
+    except Exception as e:
+        in_use = set()
+        outcome.update({g: f"error:{str(e)}" for g in candidates})
+    to_delete = []
+    for g in dict.fromkeys(group_ids):
+        if g in outcome:
+            continue
+        if g not in groups:
+            outcome[g] = "not_found"
+        # skip default
+        elif groups[g]["GroupName"] == "default":
+            outcome[g] = "default_group_skip"
+        elif g in in_use:
+            outcome[g] = "in_use"
+        elif dry_run:
+            outcome[g] = "dry_run_ok"
+        else:
+            to_delete.append(g)
+
+    def _delete_one(g):
+        ec2.delete_security_group(GroupId=g)
+        return "deleted"
+
+    outcome.update(_run_parallel(_delete_one, to_delete))
+    resp["results"] = [{g: outcome[g]} for g in group_ids]
     return resp
 
 # Lambda handler
@@ -134,8 +260,12 @@ def lambda_handler(event, context):
     # event expected as JSON
     action = event.get("action")
     dry_run = event.get("dry_run", True)
+    # async (Event) callers pass request_id and poll the log table for it
+    request_id = event.get("request_id")
+    # single timestamp shared by the result, ActionId and log row (naive UTC, as before)
+    timestamp = datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
 
-    result = {"action": action, "timestamp": datetime.utcnow().isoformat(), "dry_run": dry_run}
+    result = {"action": action, "timestamp": timestamp, "dry_run": dry_run}
 
     try:
         if action == "stop_instances":
@@ -158,9 +288,9 @@ def lambda_handler(event, context):
     # log to DynamoDB (best-effort)
     try:
         log_item = {
-            "ActionId": f"{action}-{datetime.utcnow().isoformat()}",
+            "ActionId": request_id or f"{action}-{timestamp}",
             "Action": action,
-            "Timestamp": datetime.utcnow().isoformat(),
+            "Timestamp": timestamp,
             "DryRun": dry_run,
             "Result": str(result)
         }
@@ -5,6 +5,13 @@ import pandas as pd
 import plotly.express as px
 from datetime import datetime, timedelta
 
+# orjson parses large payloads several times faster; fall back to stdlib json
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 # -------------------------------
 # Streamlit Page Configuration
 # -------------------------------
@@ -14,15 +21,41 @@ st.set_page_config(
     layout="wide"
 )
 
+# Column dtypes for the detailed analysis table: text columns use Arrow-backed strings
+# instead of Python objects
+STRING_DTYPES = {
+    "instance_id": "string[pyarrow]",
+    "instance_type": "string[pyarrow]",
+    "status": "string[pyarrow]",
+    "recommendation": "string[pyarrow]",
+}
+# Numeric columns are coerced first (bad values -> NaN), then downcast; float32 is plenty
+# for display, and total_network stays float so a coerced NaN fits
+NUMERIC_DTYPES = {
+    "avg_cpu": "float32",
+    "max_cpu": "float32",
+    "total_network": "float64",
+    "estimated_savings": "float32"
+}
+
+COST_DTYPES = {
+    "Date": "string[pyarrow]",
+    "Service": "string[pyarrow]",
+    "Cost": "float64"
+}
+
 # -------------------------------
 # AWS Clients
 # -------------------------------
-@st.cache_resource(ttl=300)  # Cache for 5 minutes
+@st.cache_resource
 def get_aws_clients():
+    # One session for all clients so credentials/endpoints are resolved once;
+    # no TTL, the clients stay valid for the life of the process.
+    session = boto3.session.Session()
     return {
-        "s3": boto3.client("s3"),
-        "lambda": boto3.client("lambda"),
-        "ce": boto3.client("ce")
+        "s3": session.client("s3"),
+        "lambda": session.client("lambda"),
+        "ce": session.client("ce")
     }
 
 def invoke_lambda_analysis():
@@ -41,12 +74,16 @@ def invoke_lambda_analysis():
 # -------------------------------
 # Helper: Read JSON from S3
 # -------------------------------
+@st.cache_data(ttl=60, show_spinner=False)
 def get_lambda_results_from_s3(bucket_name, key):
+    # Cached per (bucket, key); errors raise so they are never cached
+    clients = get_aws_clients()
+    response = clients["s3"].get_object(Bucket=bucket_name.strip(), Key=key.strip())
+    return _json_loads(response["Body"].read())
+
+def load_lambda_results(bucket_name, key):
     try:
-        clients = get_aws_clients()
-        response = clients["s3"].get_object(Bucket=bucket_name.strip(), Key=key.strip())
-        data = json.loads(response["Body"].read())
-        return data
+        return get_lambda_results_from_s3(bucket_name, key)
     except Exception as e:
         st.error(f"Error reading from S3: {str(e)}")
         return None
@@ -54,6 +91,7 @@ def get_lambda_results_from_s3(bucket_name, key):
 # -------------------------------
 # Fetch Cost Explorer Data
 # -------------------------------
+@st.cache_data(ttl=3600, show_spinner=False)  # Cost Explorer only updates daily
 def fetch_cost_explorer_data(start_date=None, end_date=None, granularity="DAILY"):
     ce = get_aws_clients()["ce"]
 
@@ -78,9 +116,37 @@ def fetch_cost_explorer_data(start_date=None, end_date=None, granularity="DAILY"
         for group in result.get("Groups", []):
             service = group["Keys"][0]
             amount = float(group["Metrics"]["UnblendedCost"]["Amount"])
-            rows.append({"Date": time_period, "Service": service, "Cost": amount})
+            rows.append((time_period, service, amount))
+
+    return pd.DataFrame(rows, columns=list(COST_DTYPES)).astype(COST_DTYPES)
+
+# -------------------------------
+# Chart Builders
+# -------------------------------
+# Cached so widget reruns reuse the figures; st.cache_data hashes DataFrame
+# arguments by content natively, so no custom hash_funcs are needed.
+@st.cache_data(ttl=60, show_spinner=False)
+def status_pie(df):
+    status_counts = df["status"].value_counts()
+    return px.pie(status_counts, values=status_counts.values, names=status_counts.index,
+                  title="Instance Status Distribution")
+
+@st.cache_data(ttl=60, show_spinner=False)
+def cpu_histogram(df):
+    fig = px.histogram(df[df["status"] != "error"], x="avg_cpu", nbins=20,
+                       title="CPU Utilization Distribution")
+    fig.update_layout(xaxis_title="Average CPU %", yaxis_title="Count")
+    return fig
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def service_cost_pie(service_summary, start_date, end_date):
+    return px.pie(service_summary, values="Cost", names="Service",
+                  title=f"Cost by AWS Service ({start_date} → {end_date})")
 
-    return pd.DataFrame(rows)
+@st.cache_data(ttl=3600, show_spinner=False)
+def daily_cost_line(df_cost, start_date, end_date):
+    return px.line(df_cost, x="Date", y="Cost", color="Service",
+                   title=f"Daily Cost by Service ({start_date} → {end_date})")
 
 # -------------------------------
 # Main App
@@ -111,13 +177,13 @@ def main():
         with st.spinner("Running fresh EC2 analysis..."):
             if invoke_lambda_analysis():
                 st.success("Analysis complete! Fetching results...")
-                # Clear any cached data
-                st.cache_resource.clear()
-                data = get_lambda_results_from_s3(s3_bucket, s3_key)
+                # Drop only the cached S3 results; the AWS clients stay warm
+                get_lambda_results_from_s3.clear()
+                data = load_lambda_results(s3_bucket, s3_key)
             else:
                 st.error("Failed to trigger analysis")
     else:
-        data = get_lambda_results_from_s3(s3_bucket, s3_key)
+        data = load_lambda_results(s3_bucket, s3_key)
     if data:
         metadata = data.get("metadata", {})
         summary = data.get("summary", {})
@@ -137,9 +203,9 @@ def main():
 
         detailed_analysis = data.get("detailed_analysis", [])
         if detailed_analysis:
-            df = pd.DataFrame(detailed_analysis)
-            for col in ["avg_cpu", "max_cpu", "total_network", "estimated_savings"]:
-                df[col] = pd.to_numeric(df[col], errors="coerce")
+            df = pd.DataFrame.from_records(detailed_analysis).astype(STRING_DTYPES)
+            for col, dtype in NUMERIC_DTYPES.items():
+                df[col] = pd.to_numeric(df[col], errors="coerce").astype(dtype)
 
             st.subheader("📋 Instance Details")
             st.dataframe(
@@ -158,15 +224,9 @@ def main():
             st.subheader("📊 Instance Visualizations")
             col1, col2 = st.columns(2)
             with col1:
-                status_counts = df["status"].value_counts()
-                fig_pie = px.pie(status_counts, values=status_counts.values, names=status_counts.index,
-                                 title="Instance Status Distribution")
-                st.plotly_chart(fig_pie, use_container_width=True)
+                st.plotly_chart(status_pie(df), use_container_width=True)
             with col2:
-                fig_hist = px.histogram(df[df["status"] != "error"], x="avg_cpu", nbins=20,
-                                        title="CPU Utilization Distribution")
-                fig_hist.update_layout(xaxis_title="Average CPU %", yaxis_title="Count")
-                st.plotly_chart(fig_hist, use_container_width=True)
+                st.plotly_chart(cpu_histogram(df), use_container_width=True)
     else:
         st.info("No idle instance data found in S3.")
 
@@ -186,6 +246,7 @@ def main():
         return
 
     if st.button("Refresh Cost Explorer Data"):
+        fetch_cost_explorer_data.clear()
         st.rerun()
 
     with st.spinner("Fetching cost data..."):
@@ -201,13 +262,11 @@ def main():
 
         col1, col2 = st.columns(2)
         with col1:
-            fig_pie = px.pie(service_summary, values="Cost", names="Service",
-                             title=f"Cost by AWS Service ({start_date} → {end_date})")
-            st.plotly_chart(fig_pie, use_container_width=True)
+            st.plotly_chart(service_cost_pie(service_summary, start_date, end_date),
+                            use_container_width=True)
         with col2:
-            fig_line = px.line(df_cost, x="Date", y="Cost", color="Service",
-                               title=f"Daily Cost by Service ({start_date} → {end_date})")
-            st.plotly_chart(fig_line, use_container_width=True)
+            st.plotly_chart(daily_cost_line(df_cost, start_date, end_date),
+                            use_container_width=True)
     else:
         st.warning("No cost data available. Make sure Cost Explorer is enabled.")
 
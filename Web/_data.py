@@ -0,0 +1,167 @@
+# _data.py -- data layer shared by dashboard3, new_dashboard and streamlit_dashboard.
+# st.cache_resource / st.cache_data are process-global, so when the dashboards run
+# as pages of one app they share these clients, reads and scans instead of each
+# page paying for (and caching) its own copy.
+import streamlit as st
+import boto3
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+# Numba is optional; when installed, pandas' numba engine JIT-compiles the dashboards'
+# groupby aggregations, otherwise the default cython kernels are used
+try:
+    import numba  # noqa: F401
+    AGG_KWARGS = {"engine": "numba", "engine_kwargs": {"nogil": True, "parallel": True}}
+except ImportError:
+    AGG_KWARGS = {}
+
+# -----------------------------
+# Config
+# -----------------------------
+DDB_TABLE = "EC2IdleInstanceMetrics"         # table storing latest state per InstanceId
+INSTANCES_TTL = 60                          # seconds the instance read is cached
+STALE_SCAN_TTL = 60                         # seconds the stale-resource scan is cached
+# GSI on DDB_TABLE: partition key Status, sort key EvaluationTimestamp. Infrastructure/ doesn't
+# define the tables, so it is provisioned out of band along with DDB_TABLE; until it exists the
+# readers fall back to a scan
+STATUS_INDEX = "StatusIndex"
+INDEX_CHECK_TTL = 3600                      # seconds a StatusIndex lookup (DescribeTable) is cached
+INDEXED_STATUSES = ("Idle", "Active")       # statuses the detection Lambda writes
+VOLUME_COLUMNS = ["VolumeId", "SizeGiB", "Region"]  # unattached EBS volume table
+# Only the attributes instances_df() reads (Status/Region are reserved words)
+STRING_COLUMNS = ("InstanceId", "Status", "Region", "InstanceType", "Recommendation",
+                  "LastUpdated", "EvaluationTimestamp")
+NUMERIC_COLUMNS = ("AvgCPU", "TotalNetworkBytes")
+PROJECTION = {
+    "ProjectionExpression": "InstanceId, #s, AvgCPU, TotalNetworkBytes, #r, InstanceType, "
+                            "Recommendation, LastUpdated, EvaluationTimestamp",
+    "ExpressionAttributeNames": {"#s": "Status", "#r": "Region"},
+}
+
+# -----------------------------
+# AWS clients (cached)
+# -----------------------------
+@st.cache_resource
+def clients():
+    session = boto3.Session()
+    return {
+        "dynamodb": session.resource("dynamodb"),
+        "lambda": session.client("lambda"),
+        "ec2": session.client("ec2"),
+        "s3": session.client("s3"),
+    }
+
+@st.cache_resource
+def warm_agg_engine():
+    # Compile the numba kernels once per process so no user click pays the JIT cost
+    if AGG_KWARGS:
+        dummy = pd.DataFrame({"k": ["a", "b"], "v": [0.0, 1.0]})
+        dummy.groupby("k")["v"].sum(**AGG_KWARGS)
+        dummy.groupby("k")["v"].mean(**AGG_KWARGS)
+    return True
+
+# -----------------------------
+# Instance state
+# -----------------------------
+def _read_columns(operation, columns, **kwargs):
+    """
+    Page through a low-level query/scan and append every projected attribute to
+    columns[name] straight from its AttributeValue (None when absent), so the frame
+    is built column-wise without Decimal objects or per-row dtype inference.
+    """
+    client = clients()["dynamodb"].meta.client
+    pages = client.get_paginator(operation).paginate(PaginationConfig={"PageSize": 1000}, **kwargs)
+    for page in pages:
+        for item in page.get("Items", []):
+            for name in STRING_COLUMNS:
+                columns[name].append(item.get(name, {}).get("S"))
+            for name in NUMERIC_COLUMNS:
+                av = item.get(name, {})
+                # numbers arrive as decimal strings; older rows may hold them as S
+                columns[name].append(av.get("N", av.get("S")))
+
+@st.cache_data(ttl=INDEX_CHECK_TTL, show_spinner=False)
+def has_status_index(table_name=DDB_TABLE):
+    """
+    Whether table_name has STATUS_INDEX, so a missing index costs one DescribeTable per
+    INDEX_CHECK_TTL instead of a failed Query on every load. True when it can't be checked
+    (e.g. no dynamodb:DescribeTable permission); the Query fallback still applies then.
+    """
+    try:
+        table = clients()["dynamodb"].meta.client.describe_table(TableName=table_name)["Table"]
+    except ClientError:
+        return True
+    return any(gsi["IndexName"] == STATUS_INDEX for gsi in table.get("GlobalSecondaryIndexes", []))
+
+# Errors raise so they are never cached; callers show them
+@st.cache_data(ttl=INSTANCES_TTL, show_spinner=False)
+def instances_df(table_name=DDB_TABLE):
+    columns = None
+    if has_status_index(table_name):
+        columns = {name: [] for name in STRING_COLUMNS + NUMERIC_COLUMNS}
+        try:
+            # Query the Status GSI per status instead of scanning every partition
+            for status in INDEXED_STATUSES:
+                _read_columns(
+                    "query",
+                    columns,
+                    TableName=table_name,
+                    IndexName=STATUS_INDEX,
+                    KeyConditionExpression="#s = :s",
+                    ExpressionAttributeValues={":s": {"S": status}},
+                    **PROJECTION
+                )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ValidationException":
+                raise
+            columns = None
+    if columns is None:
+        # StatusIndex not provisioned on this table yet: fall back to a full scan
+        columns = {name: [] for name in STRING_COLUMNS + NUMERIC_COLUMNS}
+        _read_columns("scan", columns, TableName=table_name, **PROJECTION)
+
+    df = pd.DataFrame({name: np.asarray(columns[name], dtype=object) for name in STRING_COLUMNS})
+    # One vectorized parse per numeric column; float32 is plenty for CPU %
+    df["AvgCPU"] = pd.to_numeric(np.asarray(columns["AvgCPU"], dtype=object), errors="coerce").astype("float32")
+    df["TotalNetworkBytes"] = pd.to_numeric(np.asarray(columns["TotalNetworkBytes"], dtype=object), errors="coerce")
+    return df
+
+# -----------------------------
+# Stale resources (EBS / EIP / unused SG)
+# -----------------------------
+# Stale resources change slowly; button clicks within this window reuse the last scan
+@st.cache_data(ttl=STALE_SCAN_TTL, show_spinner=False)
+def stale_resources():
+    ec2_client = clients()["ec2"]
+
+    def paginate(op, key, **kwargs):
+        return ec2_client.get_paginator(op).paginate(**kwargs).build_full_result()[key]
+
+    # The four listings are independent, so they run concurrently (latency = slowest call)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        f_vols = pool.submit(paginate, "describe_volumes", "Volumes",
+                             Filters=[{"Name":"status", "Values":["available"]}])
+        f_addrs = pool.submit(ec2_client.describe_addresses)
+        f_sgs = pool.submit(paginate, "describe_security_groups", "SecurityGroups")
+        f_enis = pool.submit(paginate, "describe_network_interfaces", "NetworkInterfaces")
+
+    # Unattached EBS volumes
+    unattached_vols = pd.DataFrame(f_vols.result(), columns=["VolumeId", "Size", "AvailabilityZone"])
+    unattached_vols["Region"] = unattached_vols["AvailabilityZone"].fillna("").str[:-1]
+    unattached_vols = unattached_vols.rename(columns={"Size": "SizeGiB"})[VOLUME_COLUMNS]
+
+    # Unassociated EIPs
+    unassoc_eips = [a for a in f_addrs.result()["Addresses"] if "AssociationId" not in a]
+
+    # Unused security groups: one ENI listing gives every group id in use (instead of one call per SG)
+    sgs = f_sgs.result()
+    in_use = {g["GroupId"] for eni in f_enis.result() for g in eni.get("Groups", [])}
+    # skip default SG
+    unused_sgs = [
+        {"GroupId": sg["GroupId"], "GroupName": sg.get("GroupName",""), "Description": sg.get("Description","")}
+        for sg in sgs
+        if sg["GroupName"] != "default" and sg["GroupId"] not in in_use
+    ]
+    return unattached_vols, unassoc_eips, unused_sgs
@@ -1,11 +1,15 @@
 import streamlit as st
 import boto3
+from botocore.config import Config
+from boto3.dynamodb.types import TypeDeserializer
 import pandas as pd
+import numpy as np
 import plotly.express as px
 from datetime import datetime
-import time
 import json
 import math
+import os
+from concurrent.futures import ThreadPoolExecutor
 
 # -----------------------------
 # Config
@@ -13,6 +17,27 @@ import math
 DDB_TABLE = "EC2IdleInstanceMetrics"         # DynamoDB table storing latest state per InstanceId
 CLEANUP_LAMBDA = "cleanup_lambda"            # Your cleanup Lambda function name
 CLEANUP_LOG_TABLE = "EC2CleanupLogs"        # optional logs table created by cleanup lambda
+SCAN_SEGMENTS = min(8, os.cpu_count() or 1)  # parallel scan segments for the metrics table
+
+# Recommendation shown per Status (anything else: "Needs review")
+RECO_MAP = {
+    "Idle": "Stop (recommended)",
+    "Active": "Running normally",
+    "Stopped": "Consider terminating if not needed",
+    "Stopping": "Wait for stop completion",
+    "Pending": "Wait for start completion",
+}
+# Only the attributes the dashboard reads (Status/Region are reserved words)
+SCAN_PROJECTION = {
+    "ProjectionExpression": "InstanceId, #s, AvgCPU, TotalNetworkBytes, #r, InstanceType, LastUpdated, EvaluationTimestamp",
+    "ExpressionAttributeNames": {"#s": "Status", "#r": "Region"},
+}
+# Instance states listed when describing the whole account instead of by id; includes
+# shutting-down/terminated so tracked ids in those states show as such, as a by-id describe would
+LIVE_INSTANCE_STATES = ["running", "stopped", "stopping", "pending", "shutting-down", "terminated"]
+# Columns every row is normalized to, even if no item carries them
+NORMALIZED_COLUMNS = ["LastUpdated", "EvaluationTimestamp", "AvgCPU", "TotalNetworkBytes",
+                      "Region", "InstanceType", "Status"]
 
 st.set_page_config(page_title="EC2 Idle Dashboard + Cleanup", layout="wide", page_icon="🧰")
 st.title("🖥️ EC2 Idle Dashboard & Cleanup Console")
@@ -23,11 +48,12 @@ st.title("🖥️ EC2 Idle Dashboard & Cleanup Console")
 @st.cache_resource
 def get_clients():
     session = boto3.Session()
+    # Connection pool sized for the scan/describe thread pools
+    config = Config(retries={"mode": "adaptive"}, max_pool_connections=16)
     return {
-        "dynamodb": session.resource("dynamodb"),
-        "lambda": session.client("lambda"),
-        "ec2": session.client("ec2"),
-        "ec2_resource": session.resource("ec2"),
+        "dynamodb": session.resource("dynamodb", config=config),
+        "lambda": session.client("lambda", config=config),
+        "ec2": session.client("ec2", config=config),
     }
 
 clients = get_clients()
@@ -35,19 +61,6 @@ clients = get_clients()
 # -----------------------------
 # Utilities
 # -----------------------------
-def fetch_instances_from_dynamo(table_name=DDB_TABLE):
-    try:
-        table = clients["dynamodb"].Table(table_name)
-        resp = table.scan()
-        items = resp.get("Items", [])
-        while "LastEvaluatedKey" in resp:
-            resp = table.scan(ExclusiveStartKey=resp["LastEvaluatedKey"])
-            items.extend(resp.get("Items", []))
-        return items
-    except Exception as e:
-        st.error(f"Error reading DynamoDB table {table_name}: {e}")
-        return []
-
 def call_cleanup_lambda(payload):
     try:
         resp = clients["lambda"].invoke(
@@ -69,28 +82,31 @@ EC2_HOURLY_COST = {
     "m5.large": 0.096, "m5.xlarge": 0.192, "m5.2xlarge": 0.384,
     "c5.large": 0.085, "c5.xlarge": 0.17, "c5.2xlarge": 0.34
 }
+EC2_COST_SERIES = pd.Series(EC2_HOURLY_COST, name="HourlyCost")
 
+# Savings are pure functions of their inputs; st.cache_data keys on the content hash
+# so reruns from widget interactions reuse the result
+@st.cache_data(show_spinner=False)
 def estimate_ec2_savings(df):
     """Estimate monthly savings from stopping idle instances (720 hours/month)."""
-    total_savings = 0.0
-    idle_instances = df[df["Status"] == "Idle"]
-    for _, row in idle_instances.iterrows():
-        cost_hr = EC2_HOURLY_COST.get(row.get("InstanceType"), 0.05)
-        total_savings += cost_hr * 24 * 30  # 720 hours/month
-    return total_savings
+    idle_types = df.loc[df["Status"].eq("Idle"), "InstanceType"].to_numpy()
+    # One reindex per call; unknown types take the 0.05/hr default
+    hourly = EC2_COST_SERIES.reindex(idle_types).fillna(0.05)
+    return float(hourly.sum()) * 24 * 30  # 720 hours/month
 
-def estimate_ebs_savings(unattached_vols):
-    """EBS ~$0.10/GB-month - uses SizeGiB value on volumes list"""
-    return sum(v.get("SizeGiB", 0) * 0.10 for v in unattached_vols)
+@st.cache_data(show_spinner=False)
+def estimate_ebs_savings(vdf):
+    """EBS ~$0.10/GB-month - uses SizeGiB column of the volumes frame"""
+    return float(vdf["SizeGiB"].sum()) * 0.10
 
 def estimate_eip_savings(unassoc_eips):
     """Elastic IP ~$0.005/hour when not attached"""
     return len(unassoc_eips) * 0.005 * 24 * 30  # monthly
 
-def estimate_total_savings(df, unattached_vols, unassoc_eips):
+def estimate_total_savings(df, vdf, unassoc_eips):
     return (
         estimate_ec2_savings(df) +
-        estimate_ebs_savings(unattached_vols) +
+        estimate_ebs_savings(vdf) +
         estimate_eip_savings(unassoc_eips)
     )
 
@@ -103,55 +119,102 @@ st.sidebar.markdown("Actions are executed by a separate Lambda for safety.")
 scan_stale = st.sidebar.checkbox("Scan stale resources (EBS/EIP/Unused SG)", value=True)
 scan_regions = st.sidebar.text_input("Region (leave blank for default session region)", value="")
 
-# Manual refresh
-if st.sidebar.button("🔄 Refresh Now"):
-    st.rerun()
+# Manual refresh (drops the cached scan below before it is read)
+refresh_now = st.sidebar.button("🔄 Refresh Now")
 
 # -----------------------------
 # Load instance state data
 # -----------------------------
-raw_items = fetch_instances_from_dynamo(DDB_TABLE)
+_deserializer = TypeDeserializer()
+
+def scan_segment(client, table_name, segment, total_segments):
+    # Low-level client (resolved by the caller on the script thread): pages come back as
+    # raw AttributeValues, deserialized per column later
+    kwargs = {"TableName": table_name, "Segment": segment, "TotalSegments": total_segments, **SCAN_PROJECTION}
+    resp = client.scan(**kwargs)
+    frames = [pd.DataFrame(resp.get("Items", []))]
+    while "LastEvaluatedKey" in resp:
+        resp = client.scan(ExclusiveStartKey=resp["LastEvaluatedKey"], **kwargs)
+        frames.append(pd.DataFrame(resp.get("Items", [])))
+    return frames
+
+# Cached for one auto-refresh interval so widget reruns don't rescan the table;
+# errors raise so they are never cached
+@st.cache_data(ttl=int(refresh_interval), show_spinner=False)
+def fetch_instances_from_dynamo(table_name=DDB_TABLE):
+    # Parallel scan: each segment pages independently, results merged at the end.
+    # Workers have no ScriptRunContext, so they get the client instead of calling get_clients()
+    client = get_clients()["dynamodb"].meta.client
+    with ThreadPoolExecutor(max_workers=SCAN_SEGMENTS) as pool:
+        segments = pool.map(lambda seg: scan_segment(client, table_name, seg, SCAN_SEGMENTS), range(SCAN_SEGMENTS))
+        frames = [frame for segment_frames in segments for frame in segment_frames]
+    # One frame per scan page, concatenated once, then AttributeValues -> Python values
+    # column by column (missing attributes stay NaN)
+    df = pd.concat(frames, ignore_index=True)
+    return df.apply(lambda col: col.map(_deserializer.deserialize, na_action="ignore"))
+
+if refresh_now:
+    fetch_instances_from_dynamo.clear()
+
+try:
+    items_df = fetch_instances_from_dynamo(DDB_TABLE)
+except Exception as e:
+    st.error(f"Error reading DynamoDB table {DDB_TABLE}: {e}")
+    items_df = pd.DataFrame()
 
-if not raw_items:
+if items_df.empty:
     st.warning("No data in DynamoDB table. Run your detection Lambda to populate latest instance state.")
     st.stop()
 
-# Ensure consistent columns and fallback for LastUpdated
-for it in raw_items:
-    if "LastUpdated" not in it:
-        # try EvaluationTimestamp fallback
-        it["LastUpdated"] = it.get("EvaluationTimestamp", datetime.utcnow().isoformat())
-    # Ensure numeric cpu exists
-    try:
-        it["AvgCPU"] = float(it.get("AvgCPU", 0) or 0)
-    except Exception:
-        it["AvgCPU"] = 0.0
-    try:
-        it["TotalNetworkBytes"] = int(it.get("TotalNetworkBytes", 0) or 0)
-    except Exception:
-        it["TotalNetworkBytes"] = 0
-    it["Region"] = it.get("Region", "unknown")
-    it["InstanceType"] = it.get("InstanceType", "unknown")
-    
-    # Enhanced recommendations based on status
-    if it.get("Status") == "Idle":
-        it["Recommendation"] = "Stop (recommended)"
-    elif it.get("Status") == "Active":
-        it["Recommendation"] = "Running normally"
-    elif it.get("Status") == "Stopped":
-        it["Recommendation"] = "Consider terminating if not needed"
-    elif it.get("Status") == "Stopping":
-        it["Recommendation"] = "Wait for stop completion"
-    elif it.get("Status") == "Pending":
-        it["Recommendation"] = "Wait for start completion"
-    else:
-        it["Recommendation"] = "Needs review"
-
-df = pd.DataFrame(raw_items)
+# Ensure consistent columns (vectorized) and fallback for LastUpdated
+df = items_df.reindex(columns=items_df.columns.union(NORMALIZED_COLUMNS, sort=False))
+df["LastUpdated"] = df["LastUpdated"].fillna(df["EvaluationTimestamp"])
+df["AvgCPU"] = pd.to_numeric(df["AvgCPU"], errors="coerce")
+df["TotalNetworkBytes"] = pd.to_numeric(df["TotalNetworkBytes"], errors="coerce")
+df = df.fillna({
+    "LastUpdated": datetime.utcnow().isoformat(),
+    "AvgCPU": 0.0,
+    "TotalNetworkBytes": 0,
+    "Region": "unknown",
+    "InstanceType": "unknown",
+}).astype({"TotalNetworkBytes": "int64"})
+
+# Enhanced recommendations based on status
+df["Recommendation"] = df["Status"].map(RECO_MAP).fillna("Needs review")
 
 # -----------------------------
 # Refresh live instance runtime state from EC2 (so stopped instances are shown correctly)
 # -----------------------------
+# Cached per set of tracked ids for one refresh interval, so UI-only reruns skip EC2;
+# a failed listing raises so it is never cached
+@st.cache_data(ttl=int(refresh_interval), show_spinner=False)
+def live_state_map(instance_ids):
+    """Map each InstanceId to its live EC2 state (running, stopped, ...)."""
+    paginator = get_clients()["ec2"].get_paginator("describe_instances")
+
+    def states_from(pages):
+        return {
+            inst["InstanceId"]: inst["State"]["Name"]
+            for page in pages
+            for res in page.get("Reservations", [])
+            for inst in res.get("Instances", [])
+        }
+
+    if len(instance_ids) <= 100:
+        # Small tracked set: describe exactly those ids (InstanceIds can't be combined with PageSize)
+        try:
+            return states_from(paginator.paginate(InstanceIds=list(instance_ids)))
+        except Exception:
+            pass  # e.g. one id no longer exists; fall back to the filtered listing
+    # Large tracked set: page through the account's live instances, 1000 per call
+    return states_from(paginator.paginate(
+        Filters=[{"Name": "instance-state-name", "Values": LIVE_INSTANCE_STATES}],
+        PaginationConfig={"PageSize": 1000}
+    ))
+
+if refresh_now:
+    live_state_map.clear()
+
 def enrich_with_live_instance_state(df_in):
     """Query EC2 DescribeInstances for instance IDs in df and add InstanceState column.
        For running instances, keep Idle/Active logic using AvgCPU; for non-running, set Status to stopped/stopping/etc.
@@ -159,48 +222,35 @@ def enrich_with_live_instance_state(df_in):
     if df_in.empty:
         return df_in
 
-    instance_ids = df_in["InstanceId"].dropna().unique().tolist()
+    instance_ids = tuple(sorted(df_in["InstanceId"].dropna().unique()))
     if not instance_ids:
         df_in["InstanceState"] = "unknown"
         return df_in
 
-    ec2 = clients["ec2"]
-    # Describe in chunks of 100
-    live_states = {}
-    for i in range(0, len(instance_ids), 100):
-        chunk = instance_ids[i:i+100]
-        try:
-            resp = ec2.describe_instances(InstanceIds=chunk)
-            for res in resp.get("Reservations", []):
-                for inst in res.get("Instances", []):
-                    iid = inst["InstanceId"]
-                    state = inst["State"]["Name"]  # e.g., running, stopped
-                    live_states[iid] = state
-        except Exception:
-            # if describe fails (permissions or missing instance), leave unknown
-            for iid in chunk:
-                live_states.setdefault(iid, "unknown")
+    try:
+        live_states = live_state_map(instance_ids)
+    except Exception:
+        # if describe fails (permissions), leave unknown
+        live_states = {}
 
     # Map states back to df
-    df_in["InstanceState"] = df_in["InstanceId"].map(lambda x: live_states.get(x, "unknown"))
-
-    # Recompute Status: if not running, mark as that state; if running, determine Idle/Active by AvgCPU threshold (10)
-    def compute_status(row):
-        inst_state = row.get("InstanceState", "unknown")
-        if inst_state != "running":
-            return inst_state.capitalize()  # Stopped, Pending, etc.
-        # running -> use AvgCPU to determine Idle/Active
-        try:
-            avg_cpu = float(row.get("AvgCPU", 0))
-        except Exception:
-            avg_cpu = 0.0
-        return "Idle" if avg_cpu < 10.0 else "Active"
-
-    df_in["Status"] = df_in.apply(compute_status, axis=1)
+    df_in["InstanceState"] = df_in["InstanceId"].map(live_states).fillna("unknown")
+
+    # Recompute Status: if not running, mark as that state (Stopped, Pending, etc.);
+    # if running, determine Idle/Active by AvgCPU threshold (10)
+    state = df_in["InstanceState"].fillna("unknown")
+    cpu = pd.to_numeric(df_in["AvgCPU"], errors="coerce").fillna(0.0).to_numpy()
+    running = state.eq("running").to_numpy()
+    idle_active = np.where(cpu < 10.0, "Idle", "Active")
+    df_in["Status"] = np.where(running, idle_active, state.str.capitalize())
     return df_in
 
 df = enrich_with_live_instance_state(df)
 
+# Low-cardinality filter/group keys as categoricals, once all values (defaults,
+# live state, recomputed Status) are in place
+df = df.astype({c: "category" for c in ("Status", "Region", "InstanceType", "InstanceState")})
+
 # -----------------------------
 # Top KPIs
 # -----------------------------
@@ -224,7 +274,8 @@ st.markdown("---")
 # -----------------------------
 # Potential Savings Section
 # -----------------------------
-potential_savings = estimate_ec2_savings(df)
+# Only the columns the estimate reads, so the cache key hashes a small frame
+potential_savings = estimate_ec2_savings(df[["Status", "InstanceType"]])
 st.subheader("💰 Estimated Monthly Cost Savings")
 
 col_s1, col_s2 = st.columns(2)
@@ -236,11 +287,18 @@ savings_placeholder = col_s2.empty()
 # -----------------------------
 # Charts
 # -----------------------------
+@st.cache_data(show_spinner=False)
+def compute_charts(df_in):
+    """Status counts and the Region x Status table; cached on the frame's content hash."""
+    status_counts = df_in["Status"].value_counts().rename_axis("Status").reset_index(name="Count")
+    region_table = df_in.groupby(["Region", "Status"], observed=True).size().unstack(fill_value=0)
+    return status_counts, region_table
+
+status_counts, region_table = compute_charts(df[["Region", "Status"]])
+
 left, right = st.columns([2, 1])
 
 with left:
-    status_counts = df["Status"].value_counts().reset_index()
-    status_counts.columns = ["Status", "Count"]
     fig = px.pie(status_counts, names="Status", values="Count", title="Instance Status")
     st.plotly_chart(fig, use_container_width=True)
 
@@ -249,7 +307,6 @@ with left:
     st.plotly_chart(fig2, use_container_width=True)
 
 with right:
-    region_table = df.groupby(["Region", "Status"]).size().unstack(fill_value=0)
     st.subheader("By Region")
     st.dataframe(region_table)
 
@@ -267,11 +324,13 @@ with show_filters:
     sel_status = st.multiselect("Status", statuses, default=statuses)
     min_cpu = st.slider("Min Avg CPU (%)", 0.0, 100.0, 0.0)
 
-filtered = df[
-    (df["Region"].isin(sel_regions)) &
-    (df["Status"].isin(sel_status)) &
-    (df["AvgCPU"] >= min_cpu)
-].sort_values(["Status", "Region"])
+# One fused mask over plain arrays (no index alignment between the three tests)
+mask = np.logical_and.reduce([
+    df["Region"].isin(sel_regions).to_numpy(),
+    df["Status"].isin(sel_status).to_numpy(),
+    df["AvgCPU"].to_numpy() >= min_cpu,
+])
+filtered = df[mask].sort_values(["Status", "Region"])
 
 # Add selection checkbox column for bulk actions
 filtered = filtered.reset_index(drop=True)
@@ -330,62 +389,88 @@ with col_c:
 st.markdown("---")
 st.subheader("🧭 Stale Resource Detection")
 
-# Ensure lists exist even if scan_stale is False
-unattached_vols, unassoc_eips, unused_sgs = [], [], []
+# Ensure results exist even if scan_stale is False
+VOLUME_COLUMNS = ["VolumeId", "SizeGiB", "Region", "CreateTime"]
+vdf = pd.DataFrame(columns=VOLUME_COLUMNS)
+unassoc_eips, unused_sgs = [], []
+
+def scan_unattached_volumes(ec2_client):
+    vols = [
+        v
+        for page in ec2_client.get_paginator("describe_volumes").paginate(
+            Filters=[{"Name": "status", "Values": ["available"]}],
+            PaginationConfig={"PageSize": 500}
+        )
+        for v in page["Volumes"]
+    ]
+    # Columnar: derive Region/CreateTime over whole columns, not per volume
+    vdf = pd.DataFrame(vols, columns=["VolumeId", "Size", "AvailabilityZone", "CreateTime"])
+    vdf = vdf.rename(columns={"Size": "SizeGiB"})
+    vdf["Region"] = vdf["AvailabilityZone"].fillna("").str[:-1]
+    vdf["CreateTime"] = pd.to_datetime(vdf["CreateTime"]).dt.strftime("%Y-%m-%d").fillna("N/A")
+    return vdf[VOLUME_COLUMNS]
+
+def scan_unassociated_eips(ec2_client):
+    # DescribeAddresses is not paginated; one call returns all
+    addrs = ec2_client.describe_addresses()["Addresses"]
+    return [a for a in addrs if "AssociationId" not in a]
+
+def scan_unused_security_groups(ec2_client):
+    sgs = [
+        sg
+        for page in ec2_client.get_paginator("describe_security_groups").paginate(
+            PaginationConfig={"PageSize": 500}
+        )
+        for sg in page["SecurityGroups"]
+    ]
+    # One paginated ENI listing instead of a describe call per group
+    in_use = set()
+    for page in ec2_client.get_paginator("describe_network_interfaces").paginate():
+        for eni in page["NetworkInterfaces"]:
+            for g in eni.get("Groups", []):
+                in_use.add(g["GroupId"])
+    return [
+        {
+            "GroupId": sg["GroupId"],
+            "GroupName": sg.get("GroupName", ""),
+            "Description": sg.get("Description", ""),
+        }
+        for sg in sgs
+        if sg.get("GroupName") != "default" and sg["GroupId"] not in in_use
+    ]
 
 if scan_stale:
     st.info("🔍 Scanning your AWS account for stale resources (EBS, EIP, Security Groups)...")
     ec2_client = clients["ec2"]
 
-    # Unattached EBS volumes
+    # The three scans are independent; run them concurrently
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        vol_future = pool.submit(scan_unattached_volumes, ec2_client)
+        eip_future = pool.submit(scan_unassociated_eips, ec2_client)
+        sg_future = pool.submit(scan_unused_security_groups, ec2_client)
+
+    # Errors are reported per scan, so one failure only empties its own panel
     try:
-        vols = ec2_client.describe_volumes(Filters=[{"Name": "status", "Values": ["available"]}])["Volumes"]
-        unattached_vols = [
-            {
-                "VolumeId": v["VolumeId"],
-                "SizeGiB": v["Size"],
-                "Region": v.get("AvailabilityZone", "")[:-1],
-                "CreateTime": v.get("CreateTime", "").strftime("%Y-%m-%d") if v.get("CreateTime") else "N/A",
-            }
-            for v in vols
-        ]
+        vdf = vol_future.result()
     except Exception as e:
         st.error(f"Error fetching volumes: {e}")
-
-    # Unassociated Elastic IPs
     try:
-        addrs = ec2_client.describe_addresses()["Addresses"]
-        unassoc_eips = [a for a in addrs if "AssociationId" not in a]
+        unassoc_eips = eip_future.result()
     except Exception as e:
         st.error(f"Error fetching Elastic IPs: {e}")
-
-    # Unused Security Groups
     try:
-        sgs = ec2_client.describe_security_groups()["SecurityGroups"]
-        unused_sgs = []
-        for sg in sgs:
-            if sg.get("GroupName") == "default":
-                continue
-            enis = ec2_client.describe_network_interfaces(Filters=[{"Name": "group-id", "Values": [sg["GroupId"]]}])["NetworkInterfaces"]
-            if len(enis) == 0:
-                unused_sgs.append(
-                    {
-                        "GroupId": sg["GroupId"],
-                        "GroupName": sg.get("GroupName", ""),
-                        "Description": sg.get("Description", ""),
-                    }
-                )
+        unused_sgs = sg_future.result()
     except Exception as e:
         st.error(f"Error evaluating security groups: {e}")
 
     # Quick summary metrics
     colm1, colm2, colm3 = st.columns(3)
-    colm1.metric("🧾 Unattached Volumes", len(unattached_vols))
+    colm1.metric("🧾 Unattached Volumes", len(vdf))
     colm2.metric("🌐 Unassociated EIPs", len(unassoc_eips))
     colm3.metric("🛡️ Unused Security Groups", len(unused_sgs))
 
     # Calculate savings
-    stale_savings = estimate_ebs_savings(unattached_vols) + estimate_eip_savings(unassoc_eips)
+    stale_savings = estimate_ebs_savings(vdf) + estimate_eip_savings(unassoc_eips)
     total_savings = potential_savings + stale_savings
 
     st.markdown(f"### 💰 Potential Monthly Savings: **${total_savings:,.2f}**")
@@ -396,16 +481,15 @@ if scan_stale:
     # Resource Panels (Collapsible)
     # -----------------------------
     with st.expander("💾 Unattached EBS Volumes", expanded=False):
-        if unattached_vols:
-            vdf = pd.DataFrame(unattached_vols)
+        if not vdf.empty:
             st.dataframe(vdf, use_container_width=True)
             dry_run_vol = st.checkbox("🔎 Dry Run Delete Volumes (simulate)", key="dry_vol")
             if st.button("🧹 Delete Unattached Volumes (dry_run)"):
-                payload = {"action":"delete_volumes","volume_ids":[v["VolumeId"] for v in unattached_vols],"dry_run":True}
+                payload = {"action":"delete_volumes","volume_ids":vdf["VolumeId"].tolist(),"dry_run":True}
                 st.json(call_cleanup_lambda(payload))
             confirm_delete_vol = st.checkbox("⚠️ Confirm delete unattached volumes (permanent)", key="confirm_delete_vol")
             if st.button("🧹 Delete Unattached Volumes (execute)") and confirm_delete_vol:
-                payload = {"action":"delete_volumes","volume_ids":[v["VolumeId"] for v in unattached_vols],"dry_run":False}
+                payload = {"action":"delete_volumes","volume_ids":vdf["VolumeId"].tolist(),"dry_run":False}
                 st.json(call_cleanup_lambda(payload))
         else:
             st.success("✅ No unattached volumes found!")
@@ -466,7 +550,6 @@ if st.button("📜 Show last cleanup logs"):
 
 
 # Auto refresh
-time.sleep(0.5)
 # st.experimental_rerun() -- avoid continuous looping; user can use Refresh button
 #st_autorefresh = st.empty()
 #st_autorefresh.code(f"# Auto-refresh disabled to avoid loops. Use the Refresh button or
\ No newline at end of file
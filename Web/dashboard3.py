@@ -1,64 +1,101 @@
 # ec2_idle_dashboard_with_actions.py
 import streamlit as st
-import boto3
+import numpy as np
 import pandas as pd
 import plotly.express as px
 from datetime import datetime
 import time
 import json
+import uuid
+
+import _data
+
+# streamlit-autorefresh is optional; without it the page refreshes on interaction only
+try:
+    from streamlit_autorefresh import st_autorefresh
+except ImportError:
+    st_autorefresh = None
 
 # -----------------------------
 # Config
 # -----------------------------
-DDB_TABLE = "EC2IdleInstanceMetrics"         # table storing latest state per InstanceId
 CLEANUP_LAMBDA = "cleanup_lambda"   # Lambda name you will create (or change)
 CLEANUP_LOG_TABLE = "EC2CleanupLogs"        # optional logs table created by cleanup lambda
+CLEANUP_POLL_TIMEOUT = 300                  # seconds an async cleanup run is looked up (once per rerun) in CLEANUP_LOG_TABLE
 
 st.set_page_config(page_title="EC2 Idle Dashboard + Cleanup", layout="wide", page_icon="🧰")
 st.title("🖥️ EC2 Idle Dashboard & Cleanup Console")
 
 # -----------------------------
-# AWS clients (cached)
+# AWS clients (cached, shared with the other dashboards via _data)
 # -----------------------------
-@st.cache_resource
-def get_clients():
-    session = boto3.Session()
-    return {
-        "dynamodb": session.resource("dynamodb"),
-        "lambda": session.client("lambda"),
-        "ec2": session.client("ec2"),
-        "ec2_resource": session.resource("ec2"),
-    }
+clients = _data.clients()
 
-clients = get_clients()
+_data.warm_agg_engine()
 
 # -----------------------------
 # Utilities
 # -----------------------------
-def fetch_instances_from_dynamo(table_name=DDB_TABLE):
-    try:
-        table = clients["dynamodb"].Table(table_name)
-        resp = table.scan()
-        items = resp.get("Items", [])
-        while "LastEvaluatedKey" in resp:
-            resp = table.scan(ExclusiveStartKey=resp["LastEvaluatedKey"])
-            items.extend(resp.get("Items", []))
-        return items
-    except Exception as e:
-        st.error(f"Error reading DynamoDB table {table_name}: {e}")
-        return []
-
 def call_cleanup_lambda(payload):
+    # Dry runs only describe resources: invoke synchronously and show the answer
+    if payload.get("dry_run", True):
+        try:
+            resp = clients["lambda"].invoke(
+                FunctionName=CLEANUP_LAMBDA,
+                InvocationType="RequestResponse",
+                Payload=json.dumps(payload).encode()
+            )
+            resp_payload = resp["Payload"].read().decode()
+            return json.loads(resp_payload)
+        except Exception as e:
+            return {"error": str(e)}
+
+    # Real actions run asynchronously so the page isn't blocked for the whole Lambda run;
+    # the Lambda logs its result under request_id, looked up by show_cleanup_status()
+    request_id = f"{payload['action']}-{uuid.uuid4()}"
     try:
-        resp = clients["lambda"].invoke(
+        clients["lambda"].invoke(
             FunctionName=CLEANUP_LAMBDA,
-            InvocationType="RequestResponse",
-            Payload=json.dumps(payload).encode()
+            InvocationType="Event",
+            Payload=json.dumps({**payload, "request_id": request_id}).encode()
         )
-        resp_payload = resp["Payload"].read().decode()
-        return json.loads(resp_payload)
     except Exception as e:
         return {"error": str(e)}
+
+    st.session_state["cleanup_job"] = {
+        "action": payload["action"],
+        "request_id": request_id,
+        "deadline": time.time() + CLEANUP_POLL_TIMEOUT,
+    }
+    return {"request_id": request_id, "status": "submitted"}
+
+def show_cleanup_status():
+    """
+    Show the last async cleanup action, with at most one CLEANUP_LOG_TABLE lookup per rerun
+    (reruns come from autorefresh or interaction; the script thread never waits on it).
+    """
+    job = st.session_state.get("cleanup_job")
+    if not job:
+        return
+    label = f"{job['action']} ({job['request_id']})"
+    if "result" not in job and "error" not in job and time.time() < job["deadline"]:
+        try:
+            # The cleanup Lambda logs one item per run, keyed by its ActionId (= request_id)
+            item = clients["dynamodb"].Table(CLEANUP_LOG_TABLE).get_item(Key={"ActionId": job["request_id"]}).get("Item")
+            if item:
+                job["result"] = item
+        except Exception as e:
+            job["error"] = str(e)
+
+    if "result" in job:
+        st.success(f"{label} finished")
+        st.json(job["result"])
+    elif "error" in job:
+        st.warning(f"{label} submitted; cannot read {CLEANUP_LOG_TABLE}: {job['error']}")
+    elif time.time() < job["deadline"]:
+        st.info(f"{label} running; checked again on the next refresh")
+    else:
+        st.info(f"{label} has not logged a result yet; see the cleanup logs below")
 # -----------------------------
 # Cost estimation utilities
 # -----------------------------
@@ -68,31 +105,42 @@ EC2_HOURLY_COST = {
     "m5.large": 0.096, "m5.xlarge": 0.192, "m5.2xlarge": 0.384,
     "c5.large": 0.085, "c5.xlarge": 0.17, "c5.2xlarge": 0.34
 }
+COST_SERIES = pd.Series(EC2_HOURLY_COST)
 
-def estimate_ec2_savings(df):
-    """Estimate monthly savings from stopping idle instances."""
-    total_savings = 0
-    idle_instances = df[df["Status"] == "Idle"]
-    for _, row in idle_instances.iterrows():
-        cost_hr = EC2_HOURLY_COST.get(row["InstanceType"], 0.05)
-        total_savings += cost_hr * 24 * 30  # assuming 30 days
-    return total_savings
+def estimate_ec2_savings(hourly_by_status):
+    """Estimate monthly savings from stopping idle instances (summed hourly cost per Status)."""
+    return float(hourly_by_status.get("Idle", 0.0)) * 24 * 30  # assuming 30 days
 
 def estimate_ebs_savings(unattached_vols):
     """EBS ~$0.10/GB-month"""
-    return sum(v["SizeGiB"] * 0.10 for v in unattached_vols)
+    return float(unattached_vols["SizeGiB"].sum()) * 0.10
 
 def estimate_eip_savings(unassoc_eips):
     """Elastic IP ~$0.005/hour when not attached"""
     return len(unassoc_eips) * 0.005 * 24 * 30  # monthly
 
-def estimate_total_savings(df, unattached_vols, unassoc_eips):
+def estimate_total_savings(hourly_by_status, unattached_vols, unassoc_eips):
     return (
-        estimate_ec2_savings(df) +
+        estimate_ec2_savings(hourly_by_status) +
         estimate_ebs_savings(unattached_vols) +
         estimate_eip_savings(unassoc_eips)
     )
 
+# -----------------------------
+# Figure builders
+# -----------------------------
+# Keyed on the small aggregates, so reruns that don't change them reuse the figures
+@st.cache_data(ttl=60, show_spinner=False)
+def status_pie(status_counts):
+    return px.pie(status_counts, names="Status", values="Count", title="Instance Status")
+
+@st.cache_data(ttl=60, show_spinner=False)
+def cpu_histogram(counts, edges):
+    fig = px.bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, title="Average CPU Distribution")
+    fig.update_traces(width=edges[1] - edges[0])
+    fig.update_layout(xaxis_title="Avg CPU (%)", yaxis_title="Count", bargap=0)
+    return fig
+
 # -----------------------------
 # Sidebar: refresh and stale resource scan options
 # -----------------------------
@@ -101,39 +149,53 @@ refresh_interval = st.sidebar.number_input("Auto-refresh (seconds)", min_value=1
 st.sidebar.markdown("Actions are executed by a separate Lambda for safety.")
 scan_stale = st.sidebar.checkbox("Scan stale resources (EBS/EIP/Unused SG)", value=True)
 
-# Manual refresh
-if st.sidebar.button("🔄 Refresh Now"):
-    st.rerun()
+# Browser-driven auto refresh: the timer lives in the page, the script thread never sleeps
+if st_autorefresh is not None:
+    st_autorefresh(interval=int(refresh_interval) * 1000, key="ec2_dash")
+
+# Manual refresh (drops the cached reads below before they are used)
+refresh_now = st.sidebar.button("🔄 Refresh Now")
 
 # -----------------------------
-# Load instance state data
+# Load instance state data (shared cache in _data)
 # -----------------------------
-raw_items = fetch_instances_from_dynamo(DDB_TABLE)
+if refresh_now:
+    _data.instances_df.clear()
+    _data.stale_resources.clear()
+
+try:
+    df = _data.instances_df(_data.DDB_TABLE)
+except Exception as e:
+    st.error(f"Error reading DynamoDB table {_data.DDB_TABLE}: {e}")
+    df = pd.DataFrame()
 
-if not raw_items:
+if df.empty:
     st.warning("No data in DynamoDB table. Run your detection Lambda to populate latest instance state.")
     st.stop()
 
-# Ensure consistent columns and fallback for LastUpdated
-for it in raw_items:
-    if "LastUpdated" not in it:
-        # try EvaluationTimestamp fallback
-        it["LastUpdated"] = it.get("EvaluationTimestamp", datetime.utcnow().isoformat())
-    # Ensure numeric cpu exists
-    it["AvgCPU"] = float(it.get("AvgCPU", 0) or 0)
-    it["TotalNetworkBytes"] = int(it.get("TotalNetworkBytes", 0) or 0)
-    it["Region"] = it.get("Region", "unknown")
-    it["InstanceType"] = it.get("InstanceType", "unknown")
-    it["Recommendation"] = it.get("Recommendation", "")
-
-df = pd.DataFrame(raw_items)
+# Every projected column is present (None/NaN where an item lacks it); fill the gaps
+# fallback for LastUpdated: EvaluationTimestamp, then now
+df["LastUpdated"] = df["LastUpdated"].fillna(df["EvaluationTimestamp"]).fillna(datetime.utcnow().isoformat())
+df["AvgCPU"] = df["AvgCPU"].fillna(0.0)
+df["TotalNetworkBytes"] = df["TotalNetworkBytes"].fillna(0).astype("int64")
+df = df.fillna({"Region": "unknown", "InstanceType": "unknown", "Recommendation": ""})
+# Low-cardinality keys as categoricals: groupby/isin/value_counts work on int codes
+df = df.astype({"Region": "category", "Status": "category", "InstanceType": "category"})
+# Hourly cost per row (0.05 for unknown types); astype because mapping a categorical
+# can return a categorical, which has no arithmetic
+df["_hourly"] = df["InstanceType"].map(COST_SERIES).astype("float64").fillna(0.05)
 
 # -----------------------------
 # Top KPIs
 # -----------------------------
+# One groupby over Status feeds the counts, the savings and the status pie
+by_status = df.groupby("Status", observed=True)
+status_sizes = by_status.size()
+hourly_by_status = by_status["_hourly"].sum(**_data.AGG_KWARGS)
+
 total_instances = len(df)
-idle_count = df[df["Status"] == "Idle"].shape[0]
-active_count = df[df["Status"] == "Active"].shape[0]
+idle_count = int(status_sizes.get("Idle", 0))
+active_count = int(status_sizes.get("Active", 0))
 last_update = df["LastUpdated"].max()
 
 st.metric("Total Instances", total_instances)
@@ -150,7 +212,7 @@ st.markdown("---")
 # -----------------------------
 # Potential Savings Section
 # -----------------------------
-potential_savings = estimate_ec2_savings(df)
+potential_savings = estimate_ec2_savings(hourly_by_status)
 st.subheader("💰 Estimated Monthly Cost Savings")
 
 col_s1, col_s2 = st.columns(2)
@@ -166,17 +228,16 @@ savings_placeholder = col_s2.empty()
 left, right = st.columns([2, 1])
 
 with left:
-    status_counts = df["Status"].value_counts().reset_index()
-    status_counts.columns = ["Status", "Count"]
-    fig = px.pie(status_counts, names="Status", values="Count", title="Instance Status")
-    st.plotly_chart(fig, use_container_width=True)
+    status_counts = status_sizes.rename_axis("Status").reset_index(name="Count")
+    st.plotly_chart(status_pie(status_counts), use_container_width=True)
 
-    fig2 = px.histogram(df, x="AvgCPU", nbins=20, title="Average CPU Distribution")
-    fig2.update_layout(xaxis_title="Avg CPU (%)")
-    st.plotly_chart(fig2, use_container_width=True)
+    # Binned here so the browser receives 20 counts rather than every AvgCPU value
+    counts, edges = np.histogram(df["AvgCPU"].to_numpy(), bins=20, range=(0, 100))
+    st.plotly_chart(cpu_histogram(counts, edges), use_container_width=True)
 
 with right:
-    region_table = df.groupby(["Region", "Status"]).size().unstack(fill_value=0)
+    # Counted straight off the category codes; no MultiIndex to build and unstack
+    region_table = pd.crosstab(df["Region"], df["Status"])
     st.subheader("By Region")
     st.dataframe(region_table)
 
@@ -243,11 +304,12 @@ with col_b:
         st.success("Start action invoked. See results below.")
         st.json(res)
 with col_c:
-    if st.button("🗑️ Terminate Selected Instances (irreversible)") and selected_ids:
-        if st.confirm("Are you sure you want to TERMINATE selected instances? This is irreversible."):
-            payload = {"action": "terminate_instances", "instance_ids": selected_ids, "dry_run": False}
-            res = call_cleanup_lambda(payload)
-            st.json(res)
+    # Streamlit has no confirm dialog: the destructive buttons stay disabled until ticked
+    confirm_terminate = st.checkbox("I understand TERMINATE is irreversible", key="confirm_terminate")
+    if st.button("🗑️ Terminate Selected Instances (irreversible)", disabled=not confirm_terminate) and selected_ids:
+        payload = {"action": "terminate_instances", "instance_ids": selected_ids, "dry_run": False}
+        res = call_cleanup_lambda(payload)
+        st.json(res)
 
 # -----------------------------
 # Stale resource scan (EBS / EIP / unused SG)
@@ -255,28 +317,11 @@ with col_c:
 st.markdown("---")
 st.subheader("Stale Resource Detection")
 
+unattached_vols, unassoc_eips, unused_sgs = pd.DataFrame(columns=_data.VOLUME_COLUMNS), [], []
+
 if scan_stale:
     st.write("Scanning account for unattached EBS volumes, unattached Elastic IPs and unused Security Groups...")
-    ec2_client = clients["ec2"]
-    # Unattached EBS volumes
-    vols = ec2_client.describe_volumes(Filters=[{"Name":"status", "Values":["available"]}])["Volumes"]
-    unattached_vols = [{"VolumeId": v["VolumeId"], "SizeGiB": v["Size"], "Region": v.get("AvailabilityZone","")[:-1] } for v in vols]
-
-    # Unassociated EIPs
-    addrs = ec2_client.describe_addresses()["Addresses"]
-    unassoc_eips = [a for a in addrs if "AssociationId" not in a]
-
-    # Unused security groups (not in use by ENI) -- list SGs then check descriptions
-    sgs = ec2_client.describe_security_groups()["SecurityGroups"]
-    unused_sgs = []
-    for sg in sgs:
-        # skip default SG
-        if sg["GroupName"] == "default":
-            continue
-        # check if any ENIs reference this sg
-        enis = ec2_client.describe_network_interfaces(Filters=[{"Name":"group-id","Values":[sg["GroupId"]]}])["NetworkInterfaces"]
-        if len(enis) == 0:
-            unused_sgs.append({"GroupId": sg["GroupId"], "GroupName": sg.get("GroupName",""), "Description": sg.get("Description","")})
+    unattached_vols, unassoc_eips, unused_sgs = _data.stale_resources()
 
     st.write(f"Unattached EBS volumes: {len(unattached_vols)}")
     st.write(f"Unassociated EIPs: {len(unassoc_eips)}")
@@ -284,15 +329,15 @@ if scan_stale:
 
     col_v, col_e, col_s = st.columns(3)
     with col_v:
-        if unattached_vols:
-            st.dataframe(pd.DataFrame(unattached_vols), use_container_width=True)
+        if not unattached_vols.empty:
+            st.dataframe(unattached_vols, use_container_width=True, hide_index=True)
             if st.button("🧹 Delete Unattached Volumes (dry_run)"):
-                payload = {"action":"delete_volumes","volume_ids":[v["VolumeId"] for v in unattached_vols],"dry_run":True}
+                payload = {"action":"delete_volumes","volume_ids":unattached_vols["VolumeId"].tolist(),"dry_run":True}
+                st.json(call_cleanup_lambda(payload))
+            confirm_vols = st.checkbox("Permanently delete the data on these volumes", key="confirm_vols")
+            if st.button("🧹 Delete Unattached Volumes (execute)", disabled=not confirm_vols):
+                payload = {"action":"delete_volumes","volume_ids":unattached_vols["VolumeId"].tolist(),"dry_run":False}
                 st.json(call_cleanup_lambda(payload))
-            if st.button("🧹 Delete Unattached Volumes (execute)"):
-                if st.confirm("Delete unattached volumes? This will permanently delete data on those volumes."):
-                    payload = {"action":"delete_volumes","volume_ids":[v["VolumeId"] for v in unattached_vols],"dry_run":False}
-                    st.json(call_cleanup_lambda(payload))
     with col_e:
         if unassoc_eips:
             eip_df = pd.DataFrame([{"PublicIp":a.get("PublicIp"), "AllocationId":a.get("AllocationId")} for a in unassoc_eips])
@@ -300,20 +345,20 @@ if scan_stale:
             if st.button("🔓 Release Unassociated EIPs (dry_run)"):
                 payload = {"action":"release_eips","allocation_ids":[a.get("AllocationId") for a in unassoc_eips],"dry_run":True}
                 st.json(call_cleanup_lambda(payload))
-            if st.button("🔓 Release Unassociated EIPs (execute)"):
-                if st.confirm("Release selected Elastic IPs?"):
-                    payload = {"action":"release_eips","allocation_ids":[a.get("AllocationId") for a in unassoc_eips],"dry_run":False}
-                    st.json(call_cleanup_lambda(payload))
+            confirm_eips = st.checkbox("Release these Elastic IPs", key="confirm_eips")
+            if st.button("🔓 Release Unassociated EIPs (execute)", disabled=not confirm_eips):
+                payload = {"action":"release_eips","allocation_ids":[a.get("AllocationId") for a in unassoc_eips],"dry_run":False}
+                st.json(call_cleanup_lambda(payload))
     with col_s:
         if unused_sgs:
             st.dataframe(pd.DataFrame(unused_sgs), use_container_width=True)
             if st.button("🧾 Delete Unused Security Groups (dry_run)"):
                 payload = {"action":"delete_security_groups","group_ids":[g["GroupId"] for g in unused_sgs],"dry_run":True}
                 st.json(call_cleanup_lambda(payload))
-            if st.button("🧾 Delete Unused Security Groups (execute)"):
-                if st.confirm("Delete unused security groups?"):
-                    payload = {"action":"delete_security_groups","group_ids":[g["GroupId"] for g in unused_sgs],"dry_run":False}
-                    st.json(call_cleanup_lambda(payload))
+            confirm_sgs = st.checkbox("Delete these security groups", key="confirm_sgs")
+            if st.button("🧾 Delete Unused Security Groups (execute)", disabled=not confirm_sgs):
+                payload = {"action":"delete_security_groups","group_ids":[g["GroupId"] for g in unused_sgs],"dry_run":False}
+                st.json(call_cleanup_lambda(payload))
 
 # Calculate potential stale resource savings
 stale_savings = estimate_ebs_savings(unattached_vols) + estimate_eip_savings(unassoc_eips)
@@ -323,6 +368,7 @@ savings_placeholder.metric("Total Potential Monthly Savings", f"${total_savings:
 
 st.markdown("---")
 st.subheader("Logs / Cleanup Results")
+show_cleanup_status()
 if st.button("Show last cleanup logs"):
     # optional: fetch logs from a DynamoDB table the cleanup Lambda writes to
     try:
@@ -331,7 +377,3 @@ if st.button("Show last cleanup logs"):
         st.dataframe(pd.DataFrame(resp.get("Items", [])))
     except Exception as e:
         st.error("No cleanup log table found or cannot access it: " + str(e))
-
-# Auto refresh
-time.sleep(0.5)
-#st.rerun() if refresh_interval and refresh_interval > 0 else None
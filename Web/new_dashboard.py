@@ -1,13 +1,26 @@
 import streamlit as st
-import boto3
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
 import pandas as pd
 from datetime import datetime, timedelta
 import plotly.express as px
 import json
+import re
+import time
+
+import _data
 
 # ---------- CONFIGURATION ----------
-TABLE_NAME = "EC2IdleInstanceMetrics"
+TABLE_NAME = _data.DDB_TABLE
 REFRESH_INTERVAL = 120  # seconds (auto-refresh every 2 minutes)
+TREND_BUCKET = "5min"  # CPU trend resolution
+INSTANCE_ID_RE = re.compile(r"^i-(?:[0-9a-f]{8}|[0-9a-f]{17})$")  # a complete EC2 instance id
+# Everything the dashboard reads (Status/Region are reserved words)
+PROJECTION = {
+    "ProjectionExpression": "InstanceId, #r, InstanceType, #s, AvgCPU, MaxCPU, NetworkInBytes, "
+                            "NetworkOutBytes, TotalNetworkBytes, Recommendation, EvaluationTimestamp, Tags",
+    "ExpressionAttributeNames": {"#s": "Status", "#r": "Region"},
+}
 st.set_page_config(
     page_title="AWS Cost Optimization Dashboard",
     page_icon="💰",
@@ -18,20 +31,43 @@ st.set_page_config(
 st.title("💰 AWS Cost Optimization Dashboard")
 st.markdown("Real-time visualization of EC2 instance activity, fetched from **DynamoDB**.")
 
-# ---------- AWS DYNAMODB CONNECTION ----------
-@st.cache_data(ttl=REFRESH_INTERVAL)
-def load_data():
-    dynamodb = boto3.resource("dynamodb")
-    table = dynamodb.Table(TABLE_NAME)
-
-    # Scan table (you can replace with query for optimization)
-    response = table.scan()
-    items = response.get("Items", [])
+_data.warm_agg_engine()
 
-    # Handle pagination
-    while "LastEvaluatedKey" in response:
-        response = table.scan(ExclusiveStartKey=response["LastEvaluatedKey"])
-        items.extend(response.get("Items", []))
+# ---------- AWS DYNAMODB CONNECTION ----------
+# Held as a shared resource: st.cache_data would hash and re-pickle the whole frame on
+# every rerun. Never mutate the returned object in place; use load_data() instead.
+@st.cache_resource(ttl=REFRESH_INTERVAL, max_entries=8)
+def _load_df_shared(since):
+    table = _data.clients()["dynamodb"].Table(TABLE_NAME)
+
+    def read_all(read, **kwargs):
+        response = read(**kwargs)
+        items = response.get("Items", [])
+        # Handle pagination
+        while "LastEvaluatedKey" in response:
+            response = read(ExclusiveStartKey=response["LastEvaluatedKey"], **kwargs)
+            items.extend(response.get("Items", []))
+        return items
+
+    items = None
+    if _data.has_status_index(TABLE_NAME):
+        try:
+            # Query the Status GSI per status, only rows evaluated since `since` (sort key range)
+            items = []
+            for status in _data.INDEXED_STATUSES:
+                items.extend(read_all(
+                    table.query,
+                    IndexName=_data.STATUS_INDEX,
+                    KeyConditionExpression=Key("Status").eq(status) & Key("EvaluationTimestamp").gte(since),
+                    **PROJECTION
+                ))
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ValidationException":
+                raise
+            items = None
+    if items is None:
+        # StatusIndex not provisioned yet: fall back to a full scan
+        items = read_all(table.scan, FilterExpression=Attr("EvaluationTimestamp").gte(since), **PROJECTION)
 
     # Convert to DataFrame
     if not items:
@@ -43,31 +79,79 @@ def load_data():
         df[col] = pd.to_numeric(df[col], errors="coerce")
 
     df["EvaluationTimestamp"] = pd.to_datetime(df["EvaluationTimestamp"])
+    # Low-cardinality keys as categoricals: smaller cached frame, groupby on int codes
+    df = df.astype({"Region": "category", "Status": "category", "InstanceType": "category"})
+    # Lowercased id + tags (a DynamoDB map per row; older rows hold a JSON string), built
+    # once per load so the search box is a plain substring test rather than two regex scans
+    tags = df["Tags"].astype(str) if "Tags" in df else ""
+    df["_search"] = (df["InstanceId"].astype(str) + "\x1f" + tags).str.lower()
     return df
 
 
-data = load_data()
+def load_data(hours):
+    """Shallow copy of the shared frame: adding/replacing columns is safe, in-place edits are not."""
+    # Lower bound floored to the refresh interval so the cache key is stable between refreshes;
+    # it is never later than the exact threshold, so the pandas filter below still sees every row
+    now_bucket = int(time.time()) // REFRESH_INTERVAL * REFRESH_INTERVAL
+    since = datetime.utcfromtimestamp(now_bucket) - timedelta(hours=hours)
+    return _load_df_shared(since.isoformat()).copy(deep=False)
+
+
+# Figure builders, keyed on the small aggregates so filter-only reruns that leave them
+# unchanged reuse the figures
+@st.cache_data(ttl=REFRESH_INTERVAL, show_spinner=False)
+def region_bar(region_chart):
+    return px.bar(
+        region_chart,
+        x="Region",
+        y="Count",
+        color="Status",
+        barmode="group",
+        title="Instance Distribution by Region",
+        color_discrete_map={"Idle": "#ff6b6b", "Active": "#1dd1a1"}
+    )
+
+
+@st.cache_data(ttl=REFRESH_INTERVAL, show_spinner=False)
+def cpu_trend_line(cpu_data):
+    return px.line(
+        cpu_data,
+        x="EvaluationTimestamp",
+        y="AvgCPU",
+        color="Status",
+        title="Average CPU Utilization Trend",
+        color_discrete_map={"Idle": "#ff9f43", "Active": "#54a0ff"}
+    )
+
+
+def _apply_filters(df, regions, statuses, since):
+    """Deliberately uncached: a widget change only costs this boolean mask over the memoized frame."""
+    return df[
+        (df["Region"].isin(regions))
+        & (df["Status"].isin(statuses))
+        & (df["EvaluationTimestamp"] >= since)
+    ].sort_values("EvaluationTimestamp", ascending=False)
+
+
+# ---------- FILTERS ----------
+st.sidebar.header("🔍 Filters")
+# Time window is chosen first so it can bound the DynamoDB query
+time_range = st.sidebar.slider("Show records from last (hours):", 1, 24, 6)
+time_threshold = datetime.utcnow() - timedelta(hours=time_range)
+
+data = load_data(time_range)
 
 if data.empty:
     st.warning("No data found in DynamoDB yet. Wait for the Lambda to insert records.")
     st.stop()
 
-# ---------- FILTERS ----------
-st.sidebar.header("🔍 Filters")
 regions = sorted(data["Region"].dropna().unique())
 selected_region = st.sidebar.multiselect("Select Region(s)", regions, default=regions)
 
 statuses = sorted(data["Status"].dropna().unique())
 selected_status = st.sidebar.multiselect("Select Status", statuses, default=statuses)
 
-time_range = st.sidebar.slider("Show records from last (hours):", 1, 24, 6)
-time_threshold = datetime.utcnow() - timedelta(hours=time_range)
-
-filtered = data[
-    (data["Region"].isin(selected_region))
-    & (data["Status"].isin(selected_status))
-    & (data["EvaluationTimestamp"] >= time_threshold)
-].sort_values("EvaluationTimestamp", ascending=False)
+filtered = _apply_filters(data, selected_region, selected_status, time_threshold)
 
 # ---------- KPIs ----------
 total_instances = len(filtered)
@@ -93,47 +177,33 @@ st.divider()
 # ---------- REGION-WISE DISTRIBUTION ----------
 if not filtered.empty:
     region_chart = (
-        filtered.groupby(["Region", "Status"])
+        filtered.groupby(["Region", "Status"], observed=True)
         .size()
         .reset_index(name="Count")
     )
-
-    fig = px.bar(
-        region_chart,
-        x="Region",
-        y="Count",
-        color="Status",
-        barmode="group",
-        title="Instance Distribution by Region",
-        color_discrete_map={"Idle": "#ff6b6b", "Active": "#1dd1a1"}
-    )
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(region_bar(region_chart), use_container_width=True)
 
 # ---------- CPU UTILIZATION TREND ----------
+# Averaged into 5-minute buckets (at most 288 points per status over the 24h max window)
+# so Plotly ships hundreds of points to the browser instead of one per raw row
 cpu_data = (
-    filtered.groupby(["EvaluationTimestamp", "Status"])["AvgCPU"]
-    .mean()
+    filtered.groupby([filtered["EvaluationTimestamp"].dt.floor(TREND_BUCKET), "Status"], observed=True)["AvgCPU"]
+    .mean(**_data.AGG_KWARGS)
     .reset_index()
     .sort_values("EvaluationTimestamp")
 )
-fig2 = px.line(
-    cpu_data,
-    x="EvaluationTimestamp",
-    y="AvgCPU",
-    color="Status",
-    title="Average CPU Utilization Trend",
-    color_discrete_map={"Idle": "#ff9f43", "Active": "#54a0ff"}
-)
-st.plotly_chart(fig2, use_container_width=True)
+st.plotly_chart(cpu_trend_line(cpu_data), use_container_width=True)
 
 # ---------- INSTANCE DETAILS TABLE ----------
 st.subheader("📋 Instance Details")
 search_id = st.text_input("Search by Instance ID or Tag:")
 if search_id:
-    filtered = filtered[
-        filtered["InstanceId"].str.contains(search_id, case=False)
-        | filtered["Tags"].str.contains(search_id, case=False)
-    ]
+    query = search_id.strip().lower()
+    if INSTANCE_ID_RE.match(query):
+        # A full instance id: exact comparison, no substring scan
+        filtered = filtered[filtered["InstanceId"] == query]
+    else:
+        filtered = filtered[filtered["_search"].str.contains(query, regex=False, na=False)]
 
 # Expandable data view
 with st.expander("Show instance data"):
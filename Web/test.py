@@ -1,6 +1,8 @@
 # dashboard.py (merged + polished)
 import streamlit as st
 import boto3
+from boto3.dynamodb.types import TypeDeserializer
+import numpy as np
 import pandas as pd
 import plotly.express as px
 from datetime import datetime
@@ -8,6 +10,15 @@ from functools import lru_cache
 import time
 import json
 from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# orjson encodes large id lists several times faster; fall back to stdlib json
+try:
+    import orjson
+    _dumps = orjson.dumps
+except ImportError:
+    def _dumps(obj):
+        return json.dumps(obj).encode()
 
 # -----------------------------
 # Config
@@ -16,45 +27,73 @@ DDB_TABLE = "EC2IdleInstanceMetrics"          # DynamoDB table storing latest st
 CLEANUP_LAMBDA = "cleanup_lambda"             # Your cleanup Lambda function name
 CLEANUP_LOG_TABLE = "EC2CleanupLogs"          # optional logs table created by cleanup lambda
 DETECTION_LAMBDA = "detect_ec2_idle_and_stale"  # <— your detector lambda (invoked from UI)
+SCAN_SEGMENTS = 8                             # parallel scan segments for DDB_TABLE
+CACHE_TTL = 600                               # upper bound for cached AWS reads (they are also keyed by refresh bucket)
+# Recommendation shown per Status (anything else keeps its own, or "Needs review")
+RECO_MAP = {
+    "Idle": "Stop (recommended)",
+    "Active": "Running normally",
+    "Stopped": "Consider terminating if not needed",
+    "Stopping": "Wait for stop completion",
+    "Pending": "Wait for start completion",
+}
+# describe_instances states listed live; terminated ones (kept ~1h by AWS) only on opt-in
+LIVE_STATES = ["pending", "running", "stopping", "stopped", "shutting-down"]
+TABLE_PAGE_ROWS = 500                         # inventory rows sent to the browser per "Show more" step
+# Columns the inventory table shows (plus the _select checkbox column)
+TABLE_COLUMNS = ["InstanceId", "Region", "InstanceType", "AvgCPU", "Status", "Recommendation"]
+# Columns every row is normalized to, even if no item carries them
+NORMALIZED_COLUMNS = ["LastUpdated", "EvaluationTimestamp", "AvgCPU", "TotalNetworkBytes",
+                      "Region", "InstanceType", "Status", "Recommendation"]
+# Only the attributes the dashboard reads (Status/Region are reserved words)
+SCAN_PROJECTION = {
+    "ProjectionExpression": "InstanceId, InstanceType, #r, AvgCPU, TotalNetworkBytes, #s, LastUpdated, "
+                            "EvaluationTimestamp, Recommendation, InstanceState",
+    "ExpressionAttributeNames": {"#s": "Status", "#r": "Region"},
+}
+# Cleanup log columns shown in the logs panel (Action/Timestamp are reserved words)
+LOG_PROJECTION = {
+    "ProjectionExpression": "ActionId, #a, #t, DryRun, #res",
+    "ExpressionAttributeNames": {"#a": "Action", "#t": "Timestamp", "#res": "Result"},
+}
 
 st.set_page_config(page_title="EC2 Idle Dashboard + Cleanup", layout="wide", page_icon="🧰")
 
 # -----------------------------
 # UI Enhancements (CSS + header)
 # -----------------------------
-st.markdown(
-    """
-    <style>
-        [data-testid="stAppViewContainer"] { background-color: #0e1117; color: #fafafa; }
-        [data-testid="stSidebar"] { background-color: #1e2229; }
-        h1, h2, h3, h4, h5, h6, .stMetric label, .stMetric { color: #ffffff !important; }
-        .stButton button { background-color: #2b313e !important; color: white !important; border-radius: 10px !important; border: 1px solid #3b4252 !important; }
-        .stButton button:hover { background-color: #3a404f !important; color: #00c4ff !important; }
-        .stDataFrame { background-color: #181c25 !important; color: white !important; }
-        .stMarkdown, .stTextInput, .stSelectbox, .stSlider { color: white !important; }
-    </style>
-    """,
-    unsafe_allow_html=True
-)
-
-st.markdown(
-    """
-    <div class="app-header">
-        <h1>🖥️ <span style='color:#2563eb;'>Intelligent AWS EC2 Cost Optimization</span> & Stale Resource Management</h1>
-    </div>
-    <div class="app-sub">
-        <p style='font-size:1.0rem;'>Monitor EC2 instance state, identify idle resources, and run safe cleanup actions via Lambda</p>
-    </div>
-    """,
-    unsafe_allow_html=True
-)
+# CSS and header in one module-level string, emitted with a single markdown element
+_HEADER_HTML = """
+<style>
+    [data-testid="stAppViewContainer"] { background-color: #0e1117; color: #fafafa; }
+    [data-testid="stSidebar"] { background-color: #1e2229; }
+    h1, h2, h3, h4, h5, h6, .stMetric label, .stMetric { color: #ffffff !important; }
+    .stButton button { background-color: #2b313e !important; color: white !important; border-radius: 10px !important; border: 1px solid #3b4252 !important; }
+    .stButton button:hover { background-color: #3a404f !important; color: #00c4ff !important; }
+    .stDataFrame { background-color: #181c25 !important; color: white !important; }
+    .stMarkdown, .stTextInput, .stSelectbox, .stSlider { color: white !important; }
+</style>
+<div class="app-header">
+    <h1>🖥️ <span style='color:#2563eb;'>Intelligent AWS EC2 Cost Optimization</span> & Stale Resource Management</h1>
+</div>
+<div class="app-sub">
+    <p style='font-size:1.0rem;'>Monitor EC2 instance state, identify idle resources, and run safe cleanup actions via Lambda</p>
+</div>
+"""
+st.markdown(_HEADER_HTML, unsafe_allow_html=True)
 
 # -----------------------------
 # AWS clients (cached)
 # -----------------------------
+# One session per process (cached, since Streamlit re-executes module code on every rerun):
+# config/credentials are read once and every client shares it
+@st.cache_resource
+def get_session():
+    return boto3.Session()
+
 @st.cache_resource
 def get_clients():
-    session = boto3.Session()
+    session = get_session()
     return {
         "dynamodb": session.resource("dynamodb"),
         "lambda": session.client("lambda"),
@@ -67,19 +106,46 @@ clients = get_clients()
 # -----------------------------
 # Utilities (Dynamo + Lambda)
 # -----------------------------
-def fetch_instances_from_dynamo(table_name=DDB_TABLE):
-    """Fetch all items with strong consistency so fresh Lambda writes appear immediately."""
-    try:
-        table = clients["dynamodb"].Table(table_name)
-        resp = table.scan(ConsistentRead=True)
-        items = resp.get("Items", [])
-        while "LastEvaluatedKey" in resp:
-            resp = table.scan(ExclusiveStartKey=resp["LastEvaluatedKey"], ConsistentRead=True)
-            items.extend(resp.get("Items", []))
-        return items
-    except Exception as e:
-        st.error(f"Error reading DynamoDB table {table_name}: {e}")
-        return []
+_deserializer = TypeDeserializer()
+
+def scan_segment(client, table_name, segment, total_segments, consistent_read):
+    # Low-level client (thread-safe, unlike resource objects); AttributeValues are
+    # deserialized here so callers get the same plain items a Table scan returns
+    paginator = client.get_paginator("scan")
+    pages = paginator.paginate(TableName=table_name, Segment=segment, TotalSegments=total_segments,
+                               ConsistentRead=consistent_read, **SCAN_PROJECTION)
+    return [
+        {k: _deserializer.deserialize(v) for k, v in item.items()}
+        for page in pages
+        for item in page.get("Items", [])
+    ]
+
+
+# Cached per refresh bucket (int(time.time() // refresh_interval)), so reruns from filters and
+# clicks within one auto-refresh interval skip DynamoDB; errors raise so they are never cached
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def fetch_instances_from_dynamo(table_name=DDB_TABLE, refresh_bucket=0, total_segments=SCAN_SEGMENTS, consistent_read=False):
+    """Fetch all items with a parallel segmented scan; consistent_read makes fresh Lambda writes visible immediately."""
+    # Resolved once on the script thread: workers have no ScriptRunContext for get_clients()
+    client = get_clients()["dynamodb"].meta.client
+    # Each segment pages independently on its own thread; results are concatenated in segment order
+    with ThreadPoolExecutor(max_workers=total_segments) as pool:
+        segments = pool.map(lambda seg: scan_segment(client, table_name, seg, total_segments, consistent_read),
+                            range(total_segments))
+        return [item for items in segments for item in items]
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def fetch_all_live_ec2_instances(refresh_bucket=0, include_terminated=False):
+    ec2 = get_clients()["ec2"]
+    all_instances = []
+    states = LIVE_STATES + ["terminated"] if include_terminated else LIVE_STATES
+    paginator = ec2.get_paginator("describe_instances")
+    for page in paginator.paginate(Filters=[{"Name": "instance-state-name", "Values": states}]):
+        for reservation in page.get("Reservations", []):
+            for inst in reservation.get("Instances", []):
+                all_instances.append(inst)
+    return all_instances
 
 
 def call_cleanup_lambda(payload):
@@ -87,7 +153,7 @@ def call_cleanup_lambda(payload):
         resp = clients["lambda"].invoke(
             FunctionName=CLEANUP_LAMBDA,
             InvocationType="RequestResponse",
-            Payload=json.dumps(payload).encode()
+            Payload=_dumps(payload)
         )
         resp_payload = resp["Payload"].read().decode()
         return json.loads(resp_payload)
@@ -101,7 +167,7 @@ def call_detection_lambda(payload=None):
         resp = clients["lambda"].invoke(
             FunctionName=DETECTION_LAMBDA,
             InvocationType="RequestResponse",  # wait for completion
-            Payload=json.dumps(payload or {}).encode(),
+            Payload=_dumps(payload or {}),
         )
         body = resp["Payload"].read().decode() or "{}"
         return json.loads(body)
@@ -118,14 +184,13 @@ EC2_HOURLY_COST = {
     "m5.large": 0.096, "m5.xlarge": 0.192, "m5.2xlarge": 0.384,
     "c5.large": 0.085, "c5.xlarge": 0.17, "c5.2xlarge": 0.34
 }
+EC2_COST_SERIES = pd.Series(EC2_HOURLY_COST, name="HourlyCost")
 
 def estimate_ec2_savings(df):
-    total_savings = 0.0
-    idle_instances = df[df["Status"] == "Idle"]
-    for _, row in idle_instances.iterrows():
-        cost_hr = EC2_HOURLY_COST.get(row.get("InstanceType"), 0.05)
-        total_savings += cost_hr * 24 * 30  # 720 hours/month
-    return total_savings
+    idle_types = df.loc[df["Status"] == "Idle", "InstanceType"].to_numpy()
+    # One vectorized lookup; unknown types take the 0.05/hr default
+    hourly = EC2_COST_SERIES.reindex(idle_types).fillna(0.05)
+    return float(hourly.sum()) * 24 * 30  # 720 hours/month
 
 
 def estimate_ebs_savings(unattached_vols):
@@ -152,6 +217,10 @@ refresh_interval = st.sidebar.number_input("Auto-refresh (seconds)", min_value=1
 st.sidebar.markdown("Actions are executed by a separate Lambda for safety.")
 scan_stale = st.sidebar.checkbox("Scan stale resources (EBS/EIP/Unused SG)", value=True)
 scan_regions = st.sidebar.text_input("Region (leave blank for default session region)", value="")
+include_terminated = st.sidebar.checkbox("Include recently terminated instances", value=False)
+
+# AWS reads below are cached per refresh bucket; a new bucket starts every refresh_interval seconds
+refresh_bucket = int(time.time() // max(1, int(refresh_interval)))
 
 # Run detection now (invokes your Lambda and reloads)
 if st.sidebar.button("🛰️ Run Detection Now"):
@@ -160,133 +229,122 @@ if st.sidebar.button("🛰️ Run Detection Now"):
         st.error(f"Detection Lambda failed: {res['error']}")
     else:
         st.success("Detection completed. Fetching latest data…")
-        time.sleep(1.0)  # small pause; ConsistentRead usually enough
+        # Drop only the instance reads so the rerun sees the new rows; the stale-resource
+        # listings stay cached per refresh bucket
+        fetch_instances_from_dynamo.clear()
+        fetch_all_live_ec2_instances.clear()
+        # Strongly consistent reads only for a short window after fresh detection writes
+        st.session_state["force_consistent_until"] = time.time() + 5
         st.rerun()
 
 # Manual refresh
 if st.sidebar.button("🔄 Refresh Now"):
+    fetch_instances_from_dynamo.clear()
+    fetch_all_live_ec2_instances.clear()
     st.rerun()
 
 # Optional: gentle auto-refresh by tweaking query params
 try:
-    st.query_params(_=int(time.time() // max(1, int(refresh_interval))))
+    st.query_params(_=refresh_bucket)
 except Exception:
     pass
 
 # -----------------------------
 # Load instance state data from DynamoDB
 # -----------------------------
-raw_items = fetch_instances_from_dynamo(DDB_TABLE)
+# Eventually consistent (half the RCUs) except right after "Run Detection Now", so its rows show up.
+# Decided here rather than inside the cached function, where session state would not be part of the key.
+consistent = time.time() < st.session_state.get("force_consistent_until", 0)
+try:
+    raw_items = fetch_instances_from_dynamo(DDB_TABLE, refresh_bucket, consistent_read=consistent)
+except Exception as e:
+    st.error(f"Error reading DynamoDB table {DDB_TABLE}: {e}")
+    raw_items = []
 
 # Keep only latest row per instance (so fresh data isn't masked by history rows)
-def _parse_ts(x):
-    try:
-        return pd.to_datetime(x)
-    except Exception:
-        return pd.Timestamp(0)
-
-
 def latest_per_instance(items):
     if not items:
-        return []
+        return pd.DataFrame()
     df_hist = pd.DataFrame(items)
     if "EvaluationTimestamp" not in df_hist.columns and "LastUpdated" in df_hist.columns:
         df_hist["EvaluationTimestamp"] = df_hist["LastUpdated"]
     if "EvaluationTimestamp" not in df_hist.columns:
         df_hist["EvaluationTimestamp"] = ""
-    df_hist["__ts__"] = df_hist["EvaluationTimestamp"].apply(_parse_ts)
-    df_hist = df_hist.sort_values("__ts__").drop_duplicates(subset=["InstanceId"], keep="last")
-    return df_hist.drop(columns=["__ts__"], errors="ignore").to_dict(orient="records")
+    # One vectorized parse; unparseable stamps become NaT and sort first, like the old epoch fallback
+    df_hist["__ts__"] = pd.to_datetime(df_hist["EvaluationTimestamp"], errors="coerce", utc=True, format="ISO8601")
+    # Stable sort so equal timestamps keep their scan order
+    df_hist = df_hist.sort_values("__ts__", kind="mergesort", na_position="first").drop_duplicates(subset=["InstanceId"], keep="last")
+    return df_hist.drop(columns=["__ts__"], errors="ignore")
 
 
-raw_items = latest_per_instance(raw_items)
+ddb_df = latest_per_instance(raw_items)
 
 # -----------------------------
 # Include all currently running EC2 instances from AWS (live enrichment merge)
 # -----------------------------
 
-def fetch_all_live_ec2_instances():
-    ec2 = clients["ec2"]
-    all_instances = []
-    try:
-        paginator = ec2.get_paginator("describe_instances")
-        for page in paginator.paginate():
-            for reservation in page.get("Reservations", []):
-                for inst in reservation.get("Instances", []):
-                    all_instances.append(inst)
-    except Exception as e:
-        st.warning(f"Error fetching live EC2 instances (live enrichment): {e}")
-    return all_instances
+try:
+    live_instances = fetch_all_live_ec2_instances(refresh_bucket, include_terminated)
+except Exception as e:
+    st.warning(f"Error fetching live EC2 instances (live enrichment): {e}")
+    live_instances = []
+
+def live_instances_frame(instances):
+    """One row per live instance, with the fields shown for instances DynamoDB doesn't track yet."""
+    now = datetime.utcnow().isoformat()
+    return pd.DataFrame(
+        [
+            {
+                "InstanceId": inst["InstanceId"],
+                "InstanceType": inst.get("InstanceType", "unknown"),
+                "Region": inst.get("Placement", {}).get("AvailabilityZone", "")[:-1] or "unknown",
+                "AvgCPU": 0.0,
+                "TotalNetworkBytes": 0,
+                "Status": inst.get("State", {}).get("Name", "unknown").capitalize(),
+                "LastUpdated": now,
+                "Recommendation": "New instance (not yet tracked)",
+            }
+            for inst in instances
+            if inst.get("InstanceId")
+        ],
+        columns=["InstanceId", "InstanceType", "Region", "AvgCPU", "TotalNetworkBytes",
+                 "Status", "LastUpdated", "Recommendation"],
+    )
+
 
+# Add any new (not yet in DynamoDB) instances — keep them visible but flagged as New.
+# One hash join finds the live ids DynamoDB doesn't have, then a single concat.
+live_df = live_instances_frame(live_instances)
+ddb_ids = ddb_df[["InstanceId"]].dropna() if "InstanceId" in ddb_df.columns else pd.DataFrame(columns=["InstanceId"])
+merged = live_df.merge(ddb_ids, on="InstanceId", how="left", indicator=True, validate="one_to_one")
+new_rows = merged[merged["_merge"] == "left_only"].drop(columns="_merge")
+frames = [f for f in (ddb_df, new_rows) if not f.empty]
+items_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
 
-live_instances = fetch_all_live_ec2_instances()
-
-# Build a set of instance IDs already in DynamoDB
-ddb_ids = {item.get("InstanceId") for item in raw_items if "InstanceId" in item}
-
-# Add any new (not yet in DynamoDB) instances — keep them visible but flagged as New
-for inst in live_instances:
-    iid = inst.get("InstanceId")
-    if not iid:
-        continue
-    if iid not in ddb_ids:
-        raw_items.append({
-            "InstanceId": iid,
-            "InstanceType": inst.get("InstanceType", "unknown"),
-            "Region": inst.get("Placement", {}).get("AvailabilityZone", "")[:-1] or "unknown",
-            "AvgCPU": 0.0,
-            "TotalNetworkBytes": 0,
-            "Status": inst.get("State", {}).get("Name", "unknown").capitalize(),
-            "LastUpdated": datetime.utcnow().isoformat(),
-            "Recommendation": "New instance (not yet tracked)",
-        })
-
-if not raw_items:
+if items_df.empty:
     st.warning("No data in DynamoDB table. Run your detection Lambda to populate latest instance state.")
     st.stop()
 
 # -----------------------------
 # Normalize and sanitize loaded items
 # -----------------------------
-cleaned_items = []
-for it in raw_items:
-    # Timestamps
-    if "LastUpdated" not in it:
-        it["LastUpdated"] = it.get("EvaluationTimestamp", datetime.utcnow().isoformat())
+df = items_df
+# Every normalized column exists (NaN where no item has it), then fill column-wise
+df = df.reindex(columns=df.columns.union(NORMALIZED_COLUMNS, sort=False))
 
-    # Ensure numeric fields
-    try:
-        it["AvgCPU"] = float(it.get("AvgCPU", 0) or 0)
-    except Exception:
-        it["AvgCPU"] = 0.0
-    try:
-        it["TotalNetworkBytes"] = int(it.get("TotalNetworkBytes", 0) or 0)
-    except Exception:
-        it["TotalNetworkBytes"] = 0
-
-    # Region / Type defaults (don't drop unknowns)
-    it["Region"] = it.get("Region") or "unknown"
-    it["InstanceType"] = it.get("InstanceType", "unknown")
-
-    # Recommendations based on Status
-    status_val = it.get("Status")
-    if status_val == "Idle":
-        it["Recommendation"] = "Stop (recommended)"
-    elif status_val == "Active":
-        it["Recommendation"] = "Running normally"
-    elif status_val == "Stopped":
-        it["Recommendation"] = "Consider terminating if not needed"
-    elif status_val == "Stopping":
-        it["Recommendation"] = "Wait for stop completion"
-    elif status_val == "Pending":
-        it["Recommendation"] = "Wait for start completion"
-    else:
-        it["Recommendation"] = it.get("Recommendation", "Needs review")
+# Timestamps
+df["LastUpdated"] = df["LastUpdated"].fillna(df["EvaluationTimestamp"]).fillna(datetime.utcnow().isoformat())
 
-    cleaned_items.append(it)
+# Ensure numeric fields (unparseable -> 0)
+df["AvgCPU"] = pd.to_numeric(df["AvgCPU"], errors="coerce").fillna(0.0)
+df["TotalNetworkBytes"] = pd.to_numeric(df["TotalNetworkBytes"], errors="coerce").fillna(0).astype("int64")
 
+# Region / Type defaults (don't drop unknowns)
+df["Region"] = df["Region"].replace("", np.nan).fillna("unknown")
+df["InstanceType"] = df["InstanceType"].fillna("unknown")
 
-df = pd.DataFrame(cleaned_items)
+# Recommendations based on Status; other statuses keep theirs or need review
+df["Recommendation"] = df["Status"].map(RECO_MAP).fillna(df["Recommendation"]).fillna("Needs review")
 
 # -----------------------------
 # Refresh live instance runtime state from EC2 (status correctness)
@@ -296,61 +354,63 @@ df = pd.DataFrame(cleaned_items)
 def ec2_client_for(region_name: str):
     """Return a cached EC2 client for a specific region."""
     try:
-        return boto3.Session().client("ec2", region_name=region_name)
+        return get_session().client("ec2", region_name=region_name)
     except Exception:
         # Fallback to default client if region-specific creation fails
         return clients["ec2"]
 
+def fetch_region_states(ec2_reg):
+    """Map InstanceId -> state name for every non-terminated instance in one region ({} if the region can't be listed)."""
+    states = {}
+    try:
+        paginator = ec2_reg.get_paginator("describe_instances")
+        # Ids left out of the map (terminated) are filled in as "terminated" by the caller
+        for page in paginator.paginate(Filters=[{"Name": "instance-state-name", "Values": LIVE_STATES}]):
+            for res in page.get("Reservations", []):
+                for inst in res.get("Instances", []):
+                    iid = inst.get("InstanceId")
+                    if iid:
+                        states[iid] = inst.get("State", {}).get("Name", "unknown")
+    except Exception:
+        # On region fetch failure, leave those states as unknown
+        pass
+    return states
+
 def enrich_with_live_instance_state(df_in: pd.DataFrame):
     if df_in.empty:
         return df_in
 
+    # Shallow copy: only whole columns are (re)assigned below, so the caller's frame is untouched
+    df_in = df_in.copy(deep=False)
     # Ensure Region column exists so we can look up in the correct region
     if "Region" not in df_in.columns:
         df_in["Region"] = ""
-
-    df_in = df_in.copy()
-    df_in["InstanceState"] = df_in.get("InstanceState", "unknown")
+    prev_state = df_in["InstanceState"].fillna("unknown") if "InstanceState" in df_in.columns else "unknown"
 
     # Build live state map by querying EC2 per-region using paginated describe (no InstanceIds filter)
     # This avoids InvalidInstanceID errors for terminated/unknown IDs and ensures we see stopped/running.
     live_states = {}
     regions = sorted([r for r in df_in["Region"].dropna().unique().tolist() if r])
 
-    for region in regions:
-        ec2_reg = ec2_client_for(region)
-        try:
-            paginator = ec2_reg.get_paginator("describe_instances")
-            for page in paginator.paginate():
-                for res in page.get("Reservations", []):
-                    for inst in res.get("Instances", []):
-                        iid = inst.get("InstanceId")
-                        state = inst.get("State", {}).get("Name", "unknown")
-                        if iid:
-                            live_states[iid] = state
-        except Exception:
-            # On region fetch failure, leave those states as unknown
-            pass
-
-    # Apply states back to dataframe; if an ID not found in live map, assume terminated (better than unknown)
-    def map_state(iid, prev):
-        if not iid:
-            return prev or "unknown"
-        return live_states.get(iid, "terminated")
-
-    df_in["InstanceState"] = df_in.apply(lambda r: map_state(r.get("InstanceId"), r.get("InstanceState")), axis=1)
-
-    def compute_status(row):
-        inst_state = row.get("InstanceState", "unknown")
-        if inst_state != "running":
-            return (inst_state or "unknown").capitalize()
-        try:
-            avg_cpu = float(row.get("AvgCPU", 0))
-        except Exception:
-            avg_cpu = 0.0
-        return "Idle" if avg_cpu < 10.0 else "Active"
-
-    df_in["Status"] = df_in.apply(compute_status, axis=1)
+    # Regions are listed concurrently: wall time is the slowest region, not the sum
+    if regions:
+        with ThreadPoolExecutor(max_workers=len(regions)) as pool:
+            # Clients are created here, not in the workers: Session.client() is not thread-safe
+            futures = [pool.submit(fetch_region_states, ec2_client_for(region)) for region in regions]
+            for future in as_completed(futures):
+                live_states.update(future.result())
+
+    # Apply states back to dataframe; if an ID not found in live map, assume terminated (better than unknown).
+    # Rows without an id keep their previous state; the result has no missing states.
+    has_id = df_in["InstanceId"].notna() & df_in["InstanceId"].ne("")
+    state = df_in["InstanceId"].map(live_states).fillna("terminated")
+    state = state.where(has_id, prev_state)
+    df_in["InstanceState"] = state
+
+    # Non-running instances take their state as Status; running ones are Idle/Active by AvgCPU (10%)
+    avg_cpu = pd.to_numeric(df_in["AvgCPU"], errors="coerce").fillna(0.0)
+    df_in["Status"] = np.where(state.ne("running"), state.str.capitalize(),
+                               np.where(avg_cpu < 10.0, "Idle", "Active"))
     return df_in
 
 
@@ -360,32 +420,25 @@ df = enrich_with_live_instance_state(df)
 # Optional: filter out instances not returned by EC2 (which may hide terminated)
 # -----------------------------
 
-def list_current_instance_ids():
-    ec2 = clients["ec2"]
-    ids = []
-    try:
-        paginator = ec2.get_paginator("describe_instances")
-        for page in paginator.paginate():
-            for reservation in page.get("Reservations", []):
-                for inst in reservation.get("Instances", []):
-                    ids.append(inst.get("InstanceId"))
-    except Exception as e:
-        st.warning(f"Could not list current AWS instances for cleanup filtering: {e}")
-    return set([i for i in ids if i])
-
 st.sidebar.markdown("---")
 hide_nonexistent = st.sidebar.checkbox("Hide instances not currently returned by EC2 (may hide terminated)", value=True)
 if hide_nonexistent:
-    current_ids = list_current_instance_ids()
-    if current_ids:
+    # Same describe_instances result as the live merge above, no second listing;
+    # empty (e.g. the listing failed) means no filtering
+    current_ids = pd.Index(live_df["InstanceId"])
+    if len(current_ids):
         df = df[df["InstanceId"].isin(current_ids)]
 
-# Remove obvious empties and tidy up
-if "InstanceState" in df.columns:
-    df = df[df["InstanceState"].notna()]
-
+# Tidy up (enrichment leaves no missing InstanceState, so no notna pass is needed)
 df = df.reset_index(drop=True)
 
+# Explicit narrow dtypes once every value is final: low-cardinality keys as categoricals
+# (isin/groupby/value_counts on int codes), float32 CPU
+df = df.astype({
+    "Region": "category", "InstanceType": "category", "Status": "category",
+    "InstanceState": "category", "AvgCPU": "float32", "TotalNetworkBytes": "int64",
+})
+
 # -----------------------------
 # Top KPIs (UI-friendly card layout)
 # -----------------------------
@@ -428,8 +481,9 @@ savings_placeholder = col_s2.empty()
 left, right = st.columns([2, 1])
 with left:
     if not df.empty and "Status" in df.columns:
-        status_counts = df["Status"].value_counts().reset_index()
-        status_counts.columns = ["Status", "Count"]
+        # Counted on the category codes; categories emptied by the filters above are dropped
+        status_counts = df["Status"].value_counts(sort=False)
+        status_counts = status_counts[status_counts > 0].rename_axis("Status").reset_index(name="Count")
         fig = px.pie(status_counts, names="Status", values="Count", title="Instance Status")
         fig.update_layout(template="plotly_white", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", font=dict(size=13))
         st.plotly_chart(fig, use_container_width=True)
@@ -445,7 +499,7 @@ with left:
 with right:
     st.subheader("By Region")
     if "Region" in df.columns and not df.empty:
-        region_table = df.groupby(["Region", "Status"]).size().unstack(fill_value=0)
+        region_table = pd.crosstab(df["Region"], df["Status"])
         st.dataframe(region_table)
     else:
         st.text("No region data available.")
@@ -478,10 +532,17 @@ filtered = df[
 filtered = filtered.reset_index(drop=True)
 filtered["_select"] = False if filtered.empty else filtered.get("_select", False)
 
+# Slice the table once: only the shown columns, compact dtypes and at most table_rows rows,
+# so the Arrow payload serialized on every rerun stays small
+table_rows = st.session_state.get("table_rows", TABLE_PAGE_ROWS)
+view = filtered[TABLE_COLUMNS + ["_select"]].head(table_rows) if not filtered.empty else filtered
+if not view.empty:
+    view = view.astype({"AvgCPU": "float32", "Recommendation": "category"})
+
 try:
-    if not filtered.empty:
+    if not view.empty:
         edited = st.data_editor(
-            filtered[["InstanceId", "Region", "InstanceType", "AvgCPU", "Status", "Recommendation", "_select"]],
+            view,
             column_config={
                 "InstanceId": st.column_config.TextColumn("InstanceId"),
                 "Region": st.column_config.TextColumn("Region"),
@@ -496,10 +557,16 @@ try:
     else:
         edited = pd.DataFrame()
 except Exception:
-    st.dataframe(filtered[["InstanceId", "Region", "InstanceType", "AvgCPU", "Status", "Recommendation"]] if not filtered.empty else filtered)
+    st.dataframe(view[TABLE_COLUMNS] if not view.empty else view)
     st.warning("Editable table not available in this Streamlit version. Update Streamlit to use selection checkboxes.")
     edited = pd.DataFrame()
 
+if len(filtered) > len(view):
+    st.caption(f"Showing {len(view)} of {len(filtered)} instances.")
+    if st.button("Show more"):
+        st.session_state["table_rows"] = table_rows + TABLE_PAGE_ROWS
+        st.rerun()
+
 selected_ids = []
 if not edited.empty and "_select" in edited.columns:
     selected_ids = edited[edited["_select"] == True]["InstanceId"].tolist()
@@ -559,47 +626,97 @@ st.subheader("🧭 Stale Resource Detection")
 
 unattached_vols, unassoc_eips, unused_sgs = [], [], []
 
+
+# Stale-resource listings; they run on worker threads, so they take the client instead of
+# calling get_clients() (no ScriptRunContext there) and are cached together below
+def list_unattached_volumes(ec2_client):
+    paginator = ec2_client.get_paginator("describe_volumes")
+    vols = [
+        v
+        for page in paginator.paginate(Filters=[{"Name": "status", "Values": ["available"]}])
+        for v in page.get("Volumes", [])
+    ]
+    return [
+        {
+            "VolumeId": v.get("VolumeId"),
+            "SizeGiB": v.get("Size", 0),
+            "Region": (v.get("AvailabilityZone", "")[:-1]) if v.get("AvailabilityZone") else "unknown",
+            "CreateTime": v.get("CreateTime").strftime("%Y-%m-%d") if v.get("CreateTime") else "N/A",
+        }
+        for v in vols
+    ]
+
+
+def list_unassociated_eips(ec2_client):
+    addrs = ec2_client.describe_addresses()["Addresses"]
+    return [a for a in addrs if "AssociationId" not in a]
+
+
+def list_unused_security_groups(ec2_client):
+    sgs = [
+        sg
+        for page in ec2_client.get_paginator("describe_security_groups").paginate()
+        for sg in page.get("SecurityGroups", [])
+    ]
+    # One paginated ENI listing gives every group id in use (instead of one call per SG)
+    used = set()
+    for page in ec2_client.get_paginator("describe_network_interfaces").paginate():
+        for eni in page.get("NetworkInterfaces", []):
+            used.update(g["GroupId"] for g in eni.get("Groups", []))
+    return [
+        {
+            "GroupId": sg.get("GroupId"),
+            "GroupName": sg.get("GroupName", ""),
+            "Description": sg.get("Description", ""),
+        }
+        for sg in sgs
+        if sg.get("GroupName") != "default" and sg.get("GroupId") not in used
+    ]
+
+
+# Cached per refresh bucket like the reads above, on the script thread. Returns
+# {name: (result, error)} so one failing listing only empties its own panel.
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def list_stale_resources(_ec2_client, refresh_bucket=0):
+    listings = {
+        "volumes": list_unattached_volumes,
+        "eips": list_unassociated_eips,
+        "security_groups": list_unused_security_groups,
+    }
+    # The three listings are independent; run them concurrently (wall time = slowest call)
+    with ThreadPoolExecutor(max_workers=len(listings)) as pool:
+        futures = {name: pool.submit(fn, _ec2_client) for name, fn in listings.items()}
+    results = {}
+    for name, future in futures.items():
+        try:
+            results[name] = (future.result(), None)
+        except Exception as e:
+            results[name] = ([], str(e))
+    return results
+
+
 if scan_stale:
     st.info("🔍 Scanning your AWS account for stale resources (EBS, EIP, Security Groups)...")
-    ec2_client = clients["ec2"]
+
+    stale = list_stale_resources(clients["ec2"], refresh_bucket)
+    if any(error for _, error in stale.values()):
+        # Errors are shown now but not kept: the next run lists everything again
+        list_stale_resources.clear()
 
     # Unattached EBS volumes
-    try:
-        vols = ec2_client.describe_volumes(Filters=[{"Name": "status", "Values": ["available"]}])["Volumes"]
-        unattached_vols = [
-            {
-                "VolumeId": v.get("VolumeId"),
-                "SizeGiB": v.get("Size", 0),
-                "Region": (v.get("AvailabilityZone", "")[:-1]) if v.get("AvailabilityZone") else "unknown",
-                "CreateTime": v.get("CreateTime").strftime("%Y-%m-%d") if v.get("CreateTime") else "N/A",
-            }
-            for v in vols
-        ]
-    except Exception as e:
-        st.error(f"Error fetching volumes: {e}")
+    unattached_vols, error = stale["volumes"]
+    if error:
+        st.error(f"Error fetching volumes: {error}")
 
     # Unassociated Elastic IPs
-    try:
-        addrs = ec2_client.describe_addresses()["Addresses"]
-        unassoc_eips = [a for a in addrs if "AssociationId" not in a]
-    except Exception as e:
-        st.error(f"Error fetching Elastic IPs: {e}")
+    unassoc_eips, error = stale["eips"]
+    if error:
+        st.error(f"Error fetching Elastic IPs: {error}")
 
     # Unused Security Groups
-    try:
-        sgs = ec2_client.describe_security_groups()["SecurityGroups"]
-        for sg in sgs:
-            if sg.get("GroupName") == "default":
-                continue
-            enis = ec2_client.describe_network_interfaces(Filters=[{"Name": "group-id", "Values": [sg.get("GroupId")] }])["NetworkInterfaces"]
-            if len(enis) == 0:
-                unused_sgs.append({
-                    "GroupId": sg.get("GroupId"),
-                    "GroupName": sg.get("GroupName", ""),
-                    "Description": sg.get("Description", ""),
-                })
-    except Exception as e:
-        st.error(f"Error evaluating security groups: {e}")
+    unused_sgs, error = stale["security_groups"]
+    if error:
+        st.error(f"Error evaluating security groups: {error}")
 
     # Quick summary metrics
     colm1, colm2, colm3 = st.columns(3)
@@ -682,10 +799,7 @@ st.subheader("🪵 Cleanup Logs")
 if st.button("📜 Show last cleanup logs"):
     try:
         table = clients["dynamodb"].Table(CLEANUP_LOG_TABLE)
-        resp = table.scan(Limit=20)
+        resp = table.scan(Limit=20, **LOG_PROJECTION)
         st.dataframe(pd.DataFrame(resp.get("Items", [])))
     except Exception as e:
         st.error("No cleanup log table found or cannot access it: " + str(e))
-
-# Gentle sleep to keep UI responsive
-time.sleep(0.2)